@@ -1,19 +1,25 @@
 import os
 import tempfile
 import shutil
-from flask import Flask, request, jsonify, send_file, after_this_request
+import threading
+import uuid
+import json
+import time
+from urllib.parse import urljoin
+from flask import Flask, request, jsonify, send_file, send_from_directory, after_this_request, g, Response, stream_with_context, redirect
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import ClosingIterator
 from flask_cors import CORS
 
 # === Import tool functions ===
 from tools.word_to_pdf import word_to_pdf
-from tools.pdf_to_word import pdf_to_word
+from tools.pdf_to_word import pdf_to_word, MODES as PDF_TO_WORD_MODES
 from tools.merge_pdf import merge_pdf
-from tools.split_pdf import split_selected_pages
+from tools.split_pdf import split_selected_pages, split_pdf_to_zip, check_split
 from tools.remove_pages import remove_pages
 from tools.organize_pdf import organize_pdf
 from tools.repair_pdf import repair_pdf
-from tools.ocr_pdf import run_ocr
+from tools.ocr_pdf import run_ocr, iter_page_text, parse_lang
 from tools.excel_to_pdf import excel_to_pdf
 from tools.pdf_to_excel import pdf_to_excel
 from tools.pdf_to_image import pdf_to_image
@@ -22,15 +28,27 @@ from tools.add_watermark import add_text_watermark, add_image_watermark
 from tools.protect_pdf import protect_pdf
 from tools.unlock_pdf import unlock_pdf
 from tools.sign_pdf import sign_pdf
+from tools.compress_pdf import compress_pdf
+from tools.thumbnails import render_thumbnails, THUMB_CACHE
+from tools.documents import DocumentStore
+from tools.tracing import span, start_span, activate, deactivate
+from tools.jobs import get_broker, offload_name
+from tools.storage import get_storage, LocalStorage, RESULT_URL_TTL
 # ========== FLASK BASE SETUP ==========
 app = Flask(__name__)
 CORS(app)
 
-UPLOAD_FOLDER = "/tmp/uploads"
-OUTPUT_FOLDER = "/tmp/outputs"
+# On a shared volume when tools run on separate worker nodes (JOB_BROKER)
+UPLOAD_FOLDER = os.environ.get("UPLOAD_FOLDER", "/tmp/uploads")
+OUTPUT_FOLDER = os.environ.get("OUTPUT_FOLDER", "/tmp/outputs")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
+DOCUMENTS = DocumentStore()
+BROKER = get_broker()   # None → tools run in this process
+STORAGE = get_storage()  # None → results are sent by this process
+RESULT_DELIVERY = os.environ.get("RESULT_DELIVERY", "redirect")
+
 
 # ========== GLOBAL CLEANUP FUNCTION ==========
 def cleanup_files(*paths):
@@ -45,6 +63,223 @@ def cleanup_files(*paths):
             pass
 
 
+# ========== TRACING ==========
+@app.before_request
+def start_request_trace():
+    """
+    Root span per request (joins an incoming W3C traceparent if present).
+    POST bodies are parsed here so upload receive time gets its own span.
+    """
+    root = start_span(f"{request.method} {request.path}",
+                      method=request.method, path=request.path)
+
+    parts = request.headers.get("traceparent", "").split("-")
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        root.trace_id, root.parent_id = parts[1], parts[2]
+
+    g.trace_span = root
+    g.trace_token = activate(root)
+
+    if request.method == "POST":
+        with span("upload.receive", bytes=request.content_length or 0):
+            request.files
+
+
+@app.after_request
+def finish_request_trace(response):
+    root = g.get("trace_span")
+    if root is None:
+        return response
+
+    response.headers["X-Trace-Id"] = root.trace_id
+    root.set(status=response.status_code)
+
+    # Ends when the server has sent the whole body
+    send = start_span("response.send", parent=root)
+
+    def done():
+        send.finish()
+        root.finish()
+
+    if response.direct_passthrough:
+        # send_file() bodies skip call_on_close(), close them ourselves
+        response.response = ClosingIterator(response.response, done)
+    else:
+        response.call_on_close(done)
+    return response
+
+
+@app.teardown_request
+def reset_request_trace(exc):
+    token = g.pop("trace_token", None)
+    if token is not None:
+        try:
+            deactivate(token)
+        except ValueError:
+            pass
+
+
+def run_tool(fn, *args, **kwargs):
+    """
+    Run a tools/ function inside a "tool.<name>" span. With JOB_BROKER
+    set the call is queued for a worker node (python -m tools.jobs) and
+    this waits for its result.
+    """
+    with span(f"tool.{fn.__name__}") as s:
+        name = offload_name(fn, args, kwargs) if BROKER is not None else None
+        if name:
+            s.set(broker=True)
+            return BROKER.call(name, args, kwargs, trace=s)
+        return fn(*args, **kwargs)
+
+
+# ========== INPUT: UPLOAD OR STORED DOCUMENT ==========
+@app.before_request
+def check_document_id():
+    """Unknown / expired document_id → 404 before any tool runs."""
+    if request.method != "POST":
+        return None
+    doc_ids = [d for d in request.form.get("document_ids", "").split(",") if d.strip()]
+    if request.form.get("document_id"):
+        doc_ids.append(request.form["document_id"])
+    for doc_id in doc_ids:
+        if not DOCUMENTS.get(doc_id.strip()):
+            return jsonify({"error": f"Unknown or expired document_id: {doc_id}"}), 404
+    return None
+
+
+def save_upload(file):
+    """Save an uploaded file under a unique name, deleted after the response."""
+    path = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex}_{secure_filename(file.filename)}")
+    with span("file.save", filename=file.filename):
+        file.save(path)
+
+    @after_this_request
+    def cleanup(response):
+        cleanup_files(path)
+        return response
+
+    return path
+
+
+def get_input(field="file"):
+    """
+    Tool input for this request: the uploaded `field` file, or the stored
+    document given as document_id (no re-upload, never deleted here).
+    Returns (path, base_name) or (None, None).
+    """
+    doc_id = request.form.get("document_id", "").strip()
+    if doc_id:
+        meta = DOCUMENTS.get(doc_id)
+        return DOCUMENTS.path(doc_id), os.path.splitext(meta["filename"])[0]
+
+    file = request.files.get(field)
+    if not file:
+        return None, None
+
+    return save_upload(file), os.path.splitext(secure_filename(file.filename))[0]
+
+
+def want_save_document():
+    return request.form.get("save_as_document", "").lower() in ("1", "true", "yes", "on")
+
+
+# ========== OUTPUT OPTIONS + METRICS ==========
+METRICS = {}
+_metrics_lock = threading.Lock()
+
+
+def want_linearize():
+    """linearize=1 → linearized (fast web view) PDF with object streams."""
+    return request.form.get("linearize", "").lower() in ("1", "true", "yes", "on")
+
+
+def want_report():
+    """report=1 → per-step byte savings (compress level=lossless)."""
+    return request.form.get("report", "").lower() in ("1", "true", "yes", "on")
+
+
+def want_incremental():
+    """
+    incremental=1 → append the change to the original bytes instead of
+    rewriting the document (sign / watermark). Ignored with linearize=1.
+    """
+    return request.form.get("incremental", "").lower() in ("1", "true", "yes", "on")
+
+
+def want_delivery():
+    """
+    delivery=redirect → 303 to a signed download URL
+    delivery=url      → JSON with the signed URL
+    delivery=file     → the file itself
+    Without RESULT_STORAGE results are always sent as files.
+    """
+    if STORAGE is None:
+        return "file"
+    delivery = request.form.get("delivery", RESULT_DELIVERY).lower()
+    return delivery if delivery in ("redirect", "url", "file") else RESULT_DELIVERY
+
+
+def send_output(path, download_name):
+    """
+    send_file() for tool results + per-route input/output size metrics.
+    With save_as_document=1 the result is kept as a new document and its
+    id + metadata are returned instead of the file. With RESULT_STORAGE
+    the result goes to storage and the client downloads it from there
+    (see want_delivery).
+    """
+    size = os.path.getsize(path)
+
+    with _metrics_lock:
+        m = METRICS.setdefault(request.path, {
+            "requests": 0, "input_bytes": 0, "output_bytes": 0, "linearized": 0
+        })
+        m["requests"] += 1
+        m["input_bytes"] += request.content_length or 0
+        m["output_bytes"] += size
+        if want_linearize():
+            m["linearized"] += 1
+
+    if want_save_document():
+        meta = DOCUMENTS.add(path, download_name, move=True)
+        response = jsonify({"document": meta})
+    elif want_delivery() != "file":
+        key = STORAGE.put(path, download_name)
+        url = urljoin(request.host_url, STORAGE.url(key, download_name))
+        if want_delivery() == "url":
+            response = jsonify({"url": url, "filename": download_name, "size": size,
+                                "expires_in": RESULT_URL_TTL})
+        else:
+            response = redirect(url, code=303)
+    else:
+        response = send_file(path, as_attachment=True, download_name=download_name)
+    response.headers["X-Output-Size"] = str(size)
+    return response
+
+
+@app.route("/files/<path:key>", methods=["GET"])
+def stored_result(key):
+    """
+    Signed result links for RESULT_STORAGE=file:// when no static file
+    sidecar is in front of the app (the sidecar should normally serve these).
+    """
+    if not isinstance(STORAGE, LocalStorage):
+        return jsonify({"error": "Not found"}), 404
+    if not STORAGE.verify(key, request.args.get("md5"), request.args.get("expires")):
+        return jsonify({"error": "Invalid or expired link"}), 403
+
+    path = STORAGE.path(key)
+    if ".." in key.split("/") or not os.path.isfile(path):
+        return jsonify({"error": "Not found"}), 404
+    return send_file(path, as_attachment=True, download_name=os.path.basename(path))
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    with _metrics_lock:
+        return jsonify(METRICS)
+
+
 # ========== HOME ROUTE ==========
 @app.route("/", methods=["GET"])
 def home():
@@ -63,27 +298,58 @@ def home():
     })
 
 
+# ========== DOCUMENT SESSIONS ==========
+@app.route("/documents", methods=["POST"])
+def create_document():
+    file = request.files.get("file")
+    if not file:
+        return jsonify({"error": "No file uploaded"}), 400
+
+    meta = DOCUMENTS.add(file, file.filename)
+    return jsonify({"document": meta}), 201
+
+
+@app.route("/documents/<doc_id>", methods=["GET"])
+def get_document(doc_id):
+    meta = DOCUMENTS.get(doc_id)
+    if not meta:
+        return jsonify({"error": "Document not found"}), 404
+    return jsonify({"document": meta})
+
+
+@app.route("/documents/<doc_id>/download", methods=["GET"])
+def download_document(doc_id):
+    meta = DOCUMENTS.get(doc_id)
+    if not meta:
+        return jsonify({"error": "Document not found"}), 404
+    return send_file(DOCUMENTS.path(doc_id), as_attachment=True, download_name=meta["filename"])
+
+
+@app.route("/documents/<doc_id>", methods=["DELETE"])
+def delete_document(doc_id):
+    if not DOCUMENTS.delete(doc_id):
+        return jsonify({"error": "Document not found"}), 404
+    return jsonify({"deleted": doc_id})
+
+
 # ========== WORD → PDF ==========
 @app.route("/word-to-pdf", methods=["POST"])
 def convert_word_to_pdf():
     try:
-        file = request.files.get("file")
-        if not file:
+        in_path, name = get_input()
+        if not in_path:
             return {"error": "No file uploaded"}, 400
 
-        name = os.path.splitext(secure_filename(file.filename))[0]
-        in_path = os.path.join(UPLOAD_FOLDER, file.filename)
         out_path = os.path.join(OUTPUT_FOLDER, f"{name}.pdf")
 
-        file.save(in_path)
-        word_to_pdf(in_path, out_path)
+        run_tool(word_to_pdf, in_path, out_path)
 
         @after_this_request
         def cleanup(response):
-            cleanup_files(in_path, out_path)
+            cleanup_files(out_path)
             return response
 
-        return send_file(out_path, as_attachment=True, download_name=f"{name}.pdf")
+        return send_output(out_path, f"{name}.pdf")
 
     except Exception as e:
         return {"error": str(e)}, 500
@@ -94,23 +360,25 @@ def convert_word_to_pdf():
 @app.route("/pdf-to-word", methods=["POST"])
 def convert_pdf_to_word():
     try:
-        file = request.files.get("file")
-        if not file:
+        in_path, name = get_input()
+        if not in_path:
             return {"error": "No file uploaded"}, 400
 
-        name = os.path.splitext(secure_filename(file.filename))[0]
-        in_path = os.path.join(UPLOAD_FOLDER, file.filename)
+        # layout = full pdf2docx reconstruction, text = fast text flow
+        mode = request.form.get("mode", "layout")
+        if mode not in PDF_TO_WORD_MODES:
+            return {"error": "mode must be layout or text"}, 400
+
         out_path = os.path.join(OUTPUT_FOLDER, f"{name}.docx")
 
-        file.save(in_path)
-        pdf_to_word(in_path, out_path)
+        run_tool(pdf_to_word, in_path, out_path, mode=mode)
 
         @after_this_request
         def cleanup(response):
-            cleanup_files(in_path, out_path)
+            cleanup_files(out_path)
             return response
 
-        return send_file(out_path, as_attachment=True, download_name=f"{name}.docx")
+        return send_output(out_path, f"{name}.docx")
 
     except Exception as e:
         return {"error": str(e)}, 500
@@ -121,21 +389,25 @@ def convert_pdf_to_word():
 @app.route("/merge-pdf", methods=["POST"])
 def merge_pdfs():
     try:
+        # Uploads and/or stored documents (comma separated document_ids)
         files = request.files.getlist("files")
+        doc_ids = [d.strip() for d in request.form.get("document_ids", "").split(",") if d.strip()]
+        files = [DOCUMENTS.path(d) for d in doc_ids] + files
+
         if len(files) < 2:
             return {"error": "Upload at least 2 PDFs"}, 400
 
-        tempdir = tempfile.mkdtemp(dir="/tmp")
+        tempdir = tempfile.mkdtemp(dir=OUTPUT_FOLDER)
         out_path = os.path.join(tempdir, "merged.pdf")
 
-        merge_pdf(files, out_path)
+        run_tool(merge_pdf, files, out_path, linearize=want_linearize())
 
         @after_this_request
         def cleanup(response):
             cleanup_files(out_path, tempdir)
             return response
 
-        return send_file(out_path, as_attachment=True, download_name="Merged_File.pdf")
+        return send_output(out_path, "Merged_File.pdf")
 
     except Exception as e:
         return {"error": str(e)}, 500
@@ -146,27 +418,45 @@ def merge_pdfs():
 @app.route("/split-pdf", methods=["POST"])
 def split_pdf_api():
     try:
-        file = request.files.get("file")
+        in_path, name = get_input()
+        mode = request.form.get("mode", "pages")   # pages / every / ranges / bookmarks
         pages = request.form.get("pages")
 
-        if not file or not pages:
+        if in_path and mode != "pages":
+            # Many outputs from one parse → zip
+            value = request.form.get("n") if mode == "every" else request.form.get("ranges")
+            try:
+                check_split(mode, value)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            zip_path = os.path.join(OUTPUT_FOLDER, f"{name}_split.zip")
+
+            run_tool(split_pdf_to_zip, in_path, zip_path, mode, value,
+                     linearize=want_linearize(), name=name)
+
+            @after_this_request
+            def cleanup_zip(response):
+                cleanup_files(zip_path)
+                return response
+
+            return send_output(zip_path, f"{name}_split.zip")
+
+        if not in_path or not pages:
             return {"error": "Missing file or pages"}, 400
 
         pages_list = [int(p) for p in pages.split(",") if p.strip().isdigit()]
 
-        name = os.path.splitext(secure_filename(file.filename))[0]
-        in_path = os.path.join(UPLOAD_FOLDER, file.filename)
         out_path = os.path.join(OUTPUT_FOLDER, f"{name}_split.pdf")
 
-        file.save(in_path)
-        split_selected_pages(in_path, out_path, pages_list)
+        run_tool(split_selected_pages, in_path, out_path, pages_list, linearize=want_linearize())
 
         @after_this_request
         def cleanup(response):
-            cleanup_files(in_path, out_path)
+            cleanup_files(out_path)
             return response
 
-        return send_file(out_path, as_attachment=True, download_name=f"{name}_split.pdf")
+        return send_output(out_path, f"{name}_split.pdf")
 
     except Exception as e:
         return {"error": str(e)}, 500
@@ -177,27 +467,24 @@ def split_pdf_api():
 @app.route("/remove-pages", methods=["POST"])
 def remove_pages_api():
     try:
-        file = request.files.get("file")
+        in_path, name = get_input()
         pages = request.form.get("pages")
 
-        if not file or not pages:
+        if not in_path or not pages:
             return {"error": "Missing file or pages"}, 400
 
         pages_to_delete = [int(p) for p in pages.split(",") if p.strip().isdigit()]
 
-        name = os.path.splitext(secure_filename(file.filename))[0]
-        in_path = os.path.join(UPLOAD_FOLDER, file.filename)
         out_path = os.path.join(OUTPUT_FOLDER, f"{name}_cleaned.pdf")
 
-        file.save(in_path)
-        remove_pages(in_path, out_path, pages_to_delete)
+        run_tool(remove_pages, in_path, out_path, pages_to_delete, linearize=want_linearize())
 
         @after_this_request
         def cleanup(response):
-            cleanup_files(in_path, out_path)
+            cleanup_files(out_path)
             return response
 
-        return send_file(out_path, as_attachment=True, download_name=f"{name}_cleaned.pdf")
+        return send_output(out_path, f"{name}_cleaned.pdf")
 
     except Exception as e:
         return {"error": str(e)}, 500
@@ -208,29 +495,26 @@ def remove_pages_api():
 @app.route("/organize-pdf", methods=["POST"])
 def organize_pdf_route():
     try:
-        file = request.files.get("file")
+        in_path, name = get_input()
         order = request.form.get("order")
 
-        if not file:
+        if not in_path:
             return {"error": "No file uploaded"}, 400
         if not order:
             return {"error": "Page order missing"}, 400
 
         order = list(map(int, order.split(",")))
 
-        name = os.path.splitext(secure_filename(file.filename))[0]
-        in_path = os.path.join(UPLOAD_FOLDER, file.filename)
         out_path = os.path.join(OUTPUT_FOLDER, f"{name}_organized.pdf")
 
-        file.save(in_path)
-        organize_pdf(in_path, out_path, order)
+        run_tool(organize_pdf, in_path, out_path, order, linearize=want_linearize())
 
         @after_this_request
         def cleanup(response):
-            cleanup_files(in_path, out_path)
+            cleanup_files(out_path)
             return response
 
-        return send_file(out_path, as_attachment=True, download_name=f"{name}_organized.pdf")
+        return send_output(out_path, f"{name}_organized.pdf")
 
     except Exception as e:
         return {"error": str(e)}, 500
@@ -239,88 +523,48 @@ def organize_pdf_route():
 
 # ========== COMPRESS PDF ==========
 @app.route("/compress-pdf", methods=["POST"])
-def compress_pdf():
-    import subprocess
-    import pikepdf
-    from flask import send_file, after_this_request
-    import os
-
-    if "file" not in request.files:
+def compress_pdf_route():
+    input_path, base = get_input()
+    if not input_path:
         return {"error": "No file uploaded"}, 400
 
-    file = request.files["file"]
-    level = request.form.get("level", "balanced")
-
-    base = os.path.splitext(secure_filename(file.filename))[0]
-
-    input_path = f"/tmp/{base}_input.pdf"
-    output_path = f"/tmp/{base}_compressed.pdf"
-
-    file.save(input_path)
+    level = request.form.get("level", "balanced")   # high / balanced / low / lossless
 
-    # Ghostscript compression presets
-    quality_options = {
-        "high": "/screen",       # max compression
-        "balanced": "/ebook",    # recommended
-        "low": "/prepress"       # best quality
-    }
-
-    selected_quality = quality_options.get(level, "/ebook")
+    output_path = os.path.join(OUTPUT_FOLDER, f"{uuid.uuid4().hex}_{base}_compressed.pdf")
 
     try:
-        gs_cmd = [
-            "gs", "-sDEVICE=pdfwrite",
-            "-dCompatibilityLevel=1.5",
-            f"-dPDFSETTINGS={selected_quality}",
-            "-dNOPAUSE", "-dQUIET", "-dBATCH",
-            f"-sOutputFile={output_path}",
-            input_path
-        ]
-
-        subprocess.run(gs_cmd, check=True)
-
-    except Exception as e:
-        print("Ghostscript failed:", e)
-
-        # Fallback → pikepdf (lossless)
-        try:
-            pdf = pikepdf.open(input_path)
-            pdf.save(output_path, compression=pikepdf.CompressionLevel.compression_level_fast)
-            pdf.close()
-        except Exception as e:
-            print("Fallback failed:", e)
-            return {"error": "Compression failed"}, 500
+        report = run_tool(compress_pdf, input_path, output_path, level,
+                          linearize=want_linearize(), report=want_report())
+    except Exception:
+        return {"error": "Compression failed"}, 500
 
     @after_this_request
     def cleanup(response):
-        for p in (input_path, output_path):
-            if os.path.exists(p):
-                os.remove(p)
+        cleanup_files(output_path)
         return response
 
     final_name = f"{base}_Compressed.pdf"
 
-    return send_file(output_path, as_attachment=True, download_name=final_name)
+    response = send_output(output_path, final_name)
+    if report:
+        # Lossless mode: sizes (+ bytes saved per step with report=1)
+        response.headers["X-Optimize-Report"] = json.dumps(report, separators=(",", ":"))
+    return response
 
 
 
 @app.route("/repair-pdf", methods=["POST"])
 def repair_pdf_route():
     try:
-        file = request.files.get("file")
-        if not file:
+        input_path, original_name = get_input()
+        if not input_path:
             return jsonify({"error": "No PDF uploaded"}), 400
 
-        original_name = os.path.splitext(secure_filename(file.filename))[0]
-
-        input_path = os.path.join(UPLOAD_FOLDER, file.filename)
         output_path = os.path.join(OUTPUT_FOLDER, f"{original_name}_repaired.pdf")
 
-        file.save(input_path)
-
-        # Run Repair
+        # Run Repair (structural first, Ghostscript as last resort)
         try:
-            repair_pdf(input_path, output_path)
+            tier = run_tool(repair_pdf, input_path, output_path, linearize=want_linearize())
         except Exception as e:
             return jsonify({"error": "PDF is too damaged to repair"}), 500
 
@@ -329,30 +573,102 @@ def repair_pdf_route():
 
         @after_this_request
         def cleanup(response):
-            for p in (input_path, output_path):
-                if os.path.exists(p): os.remove(p)
+            cleanup_files(output_path)
             return response
 
-        return send_file(output_path, as_attachment=True, download_name=f"{original_name}_repaired.pdf")
+        response = send_output(output_path, f"{original_name}_repaired.pdf")
+        response.headers["X-Repair-Tier"] = tier
+        return response
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # ========== OCR (Image + PDF) ==========
+def ocr_lang():
+    """lang=eng | eng+guj | eng,guj | auto (per-page script detection)."""
+    return parse_lang(request.form.get("lang", "eng"))
+
+
+STREAM_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+
+def want_stream():
+    """
+    stream=ndjson|sse (or an Accept header asking for one of those) →
+    progressive per-page results instead of one file at the end.
+    """
+    mode = request.form.get("stream", "").lower()
+    if mode in STREAM_TYPES:
+        return mode
+    accept = request.headers.get("Accept", "")
+    for mode, mimetype in STREAM_TYPES.items():
+        if mimetype in accept:
+            return mode
+    return None
+
+
+def keep_input(path):
+    """
+    Second name for an input that a streamed body still reads after the
+    request's cleanup has removed the upload. Caller deletes it.
+    """
+    kept = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex}_stream{os.path.splitext(path)[1]}")
+    try:
+        os.link(path, kept)
+    except OSError:
+        shutil.copyfile(path, kept)
+    return kept
+
+
+def stream_ocr_text(input_path, mode, lang="eng"):
+    """
+    One event per page as soon as it is recognized, then a "done" event.
+    A client that disconnects closes this generator, which stops OCR of
+    the remaining pages.
+    """
+    def event(name, data):
+        if mode == "sse":
+            return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+        return json.dumps(dict(data, event=name)) + "\n"
+
+    def generate():
+        started = time.perf_counter()
+        pages = iter_page_text(input_path, lang)
+        count = 0
+        try:
+            for count, text, seconds in pages:
+                yield event("page", {"page": count, "text": text, "seconds": round(seconds, 3)})
+            yield event("done", {"pages": count, "seconds": round(time.perf_counter() - started, 3)})
+        except Exception as e:
+            yield event("error", {"error": str(e), "pages": count})
+        finally:
+            pages.close()
+            cleanup_files(input_path)
+
+    response = Response(stream_with_context(generate()), mimetype=STREAM_TYPES[mode])
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"     # no proxy buffering (nginx)
+    return response
+
+
 @app.route("/ocr-pdf", methods=["POST"])
 def ocr_route():
     try:
-        file = request.files.get("file")
+        input_path, original = get_input()
         output_type = request.form.get("type", "text")   # text / pdf
 
-        if not file:
+        if not input_path:
             return jsonify({"error": "No file uploaded"}), 400
 
-        original = os.path.splitext(secure_filename(file.filename))[0]
+        try:
+            lang = ocr_lang()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        # Input path
-        input_path = os.path.join(UPLOAD_FOLDER, file.filename)
-        file.save(input_path)
+        # Progressive text: runs here, not on a broker worker
+        stream = want_stream() if output_type == "text" else None
+        if stream:
+            return stream_ocr_text(keep_input(input_path), stream, lang)
 
         # Output name based on type
         if output_type == "pdf":
@@ -362,20 +678,15 @@ def ocr_route():
 
         # Import OCR function
         from tools.ocr_pdf import run_ocr
-        run_ocr(input_path, output_path, output_type)
+        run_tool(run_ocr, input_path, output_path, output_type,
+                 linearize=want_linearize(), lang=lang)
 
         @after_this_request
         def cleanup(response):
-            for p in (input_path, output_path):
-                if os.path.exists(p):
-                    os.remove(p)
+            cleanup_files(output_path)
             return response
 
-        return send_file(
-            output_path,
-            as_attachment=True,
-            download_name=os.path.basename(output_path)
-        )
+        return send_output(output_path, os.path.basename(output_path))
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -386,25 +697,20 @@ def ocr_route():
 @app.route("/excel-to-pdf", methods=["POST"])
 def excel_to_pdf_route():
     try:
-        file = request.files.get("file")
-        if not file:
+        in_path, name = get_input()
+        if not in_path:
             return jsonify({"error": "No Excel file uploaded"}), 400
 
-        name = os.path.splitext(secure_filename(file.filename))[0]
-
-        in_path = os.path.join(UPLOAD_FOLDER, file.filename)
         out_path = os.path.join(OUTPUT_FOLDER, f"{name}.pdf")
 
-        file.save(in_path)
-
-        excel_to_pdf(in_path, out_path)
+        run_tool(excel_to_pdf, in_path, out_path)
 
         @after_this_request
         def cleanup(response):
-            cleanup_files(in_path, out_path)
+            cleanup_files(out_path)
             return response
 
-        return send_file(out_path, as_attachment=True, download_name=f"{name}.pdf")
+        return send_output(out_path, f"{name}.pdf")
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -414,31 +720,26 @@ def excel_to_pdf_route():
 @app.route("/pdf-to-excel", methods=["POST"])
 def convert_pdf_to_excel():
     try:
-        file = request.files.get("file")
-        if not file:
+        in_path, name = get_input()
+        if not in_path:
             return jsonify({"error": "No PDF uploaded"}), 400
 
-        name = os.path.splitext(secure_filename(file.filename))[0]
+        try:
+            lang = ocr_lang()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        in_path = os.path.join(UPLOAD_FOLDER, file.filename)
         out_path = os.path.join(OUTPUT_FOLDER, f"{name}.xlsx")
 
-        # Save uploaded PDF
-        file.save(in_path)
-
         # Convert PDF → Excel (smart hybrid logic inside tool)
-        pdf_to_excel(in_path, out_path)
+        run_tool(pdf_to_excel, in_path, out_path, lang=lang)
 
         @after_this_request
         def cleanup(response):
-            cleanup_files(in_path, out_path)
+            cleanup_files(out_path)
             return response
 
-        return send_file(
-            out_path,
-            as_attachment=True,
-            download_name=f"{name}.xlsx"
-        )
+        return send_output(out_path, f"{name}.xlsx")
 
     except Exception as e:
         # IMPORTANT: log error for Render debugging
@@ -453,32 +754,22 @@ def convert_pdf_to_excel():
 @app.route("/pdf-to-image", methods=["POST"])
 def convert_pdf_to_image():
     try:
-        file = request.files.get("file")
-        if not file:
+        input_path, name = get_input()
+        if not input_path:
             return jsonify({"error": "No PDF uploaded"}), 400
 
-        name = os.path.splitext(secure_filename(file.filename))[0]
-
-        input_path = os.path.join(UPLOAD_FOLDER, file.filename)
         output_path = os.path.join(OUTPUT_FOLDER, f"{name}_images.zip")
 
-        # Save uploaded PDF
-        file.save(input_path)
-
         # Convert PDF → JPG (ZIP)
         from tools.pdf_to_image import pdf_to_image
-        pdf_to_image(input_path, output_path)
+        run_tool(pdf_to_image, input_path, output_path)
 
         @after_this_request
         def cleanup(response):
-            cleanup_files(input_path, output_path)
+            cleanup_files(output_path)
             return response
 
-        return send_file(
-            output_path,
-            as_attachment=True,
-            download_name=f"{name}_JPG.zip"
-        )
+        return send_output(output_path, f"{name}_JPG.zip")
 
     except Exception as e:
         print("PDF TO IMAGE ERROR:", e)
@@ -488,14 +779,56 @@ def convert_pdf_to_image():
         }), 500
 
 
+# ========== PAGE THUMBNAILS (organize / split UI) ==========
+@app.route("/thumbnails", methods=["POST"])
+def thumbnails_route():
+    try:
+        input_path, _ = get_input()
+        if not input_path:
+            return jsonify({"error": "No PDF uploaded"}), 400
+
+        first = int(request.form.get("first", 1))
+        last = request.form.get("last")
+        size = int(request.form.get("size", 160))
+
+        doc_hash, total, thumbs = run_tool(
+            render_thumbnails,
+            input_path, first=first, last=int(last) if last else None, size=size
+        )
+
+        return jsonify({
+            "document": doc_hash,
+            "page_count": total,
+            "thumbnails": [
+                {"page": n, "url": f"/thumbnails/{doc_hash}/{fname}"}
+                for n, fname in thumbs
+            ]
+        })
+
+    except Exception as e:
+        print("THUMBNAILS ERROR:", e)
+        return jsonify({"error": "Thumbnail rendering failed", "details": str(e)}), 500
+
+
+@app.route("/thumbnails/<doc_hash>/<name>", methods=["GET"])
+def thumbnail_file(doc_hash, name):
+    # Content-addressed (file hash + page + size) → safe to cache for a year
+    response = send_from_directory(
+        os.path.join(THUMB_CACHE, secure_filename(doc_hash)), secure_filename(name),
+        mimetype="image/webp", max_age=31536000
+    )
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
 # ========== ROTATE PDF ==========
 @app.route("/rotate-pdf", methods=["POST"])
 def rotate_pdf_route():
     try:
-        file = request.files.get("file")
+        in_path, name = get_input()
         rotation = request.form.get("rotation")
 
-        if not file:
+        if not in_path:
             return jsonify({"error": "No PDF uploaded"}), 400
 
         if not rotation:
@@ -506,24 +839,16 @@ def rotate_pdf_route():
         if rotation not in [90, 180, 270]:
             return jsonify({"error": "Invalid rotation angle"}), 400
 
-        name = os.path.splitext(secure_filename(file.filename))[0]
-        in_path = os.path.join(UPLOAD_FOLDER, file.filename)
         out_path = os.path.join(OUTPUT_FOLDER, f"{name}_rotated.pdf")
 
-        file.save(in_path)
-
-        rotate_pdf(in_path, out_path, rotation)
+        run_tool(rotate_pdf, in_path, out_path, rotation, linearize=want_linearize())
 
         @after_this_request
         def cleanup(response):
-            cleanup_files(in_path, out_path)
+            cleanup_files(out_path)
             return response
 
-        return send_file(
-            out_path,
-            as_attachment=True,
-            download_name=f"{name}_rotated.pdf"
-        )
+        return send_output(out_path, f"{name}_rotated.pdf")
 
     except Exception as e:
         print("ROTATE PDF ERROR:", e)
@@ -540,38 +865,32 @@ def rotate_pdf_route():
 @app.route("/add-watermark", methods=["POST"])
 def add_watermark_route():
     try:
-        file = request.files.get("file")
+        input_path, name = get_input()
         text = request.form.get("text")
         image = request.files.get("image")
         position = request.form.get("position", "diagonal")
 
-        if not file:
+        if not input_path:
             return jsonify({"error": "Missing PDF file"}), 400
         if not text and not image:
             return jsonify({"error": "Provide text or image watermark"}), 400
 
-        name = os.path.splitext(secure_filename(file.filename))[0]
-        input_path = os.path.join(UPLOAD_FOLDER, file.filename)
         output_path = os.path.join(OUTPUT_FOLDER, f"{name}_watermarked.pdf")
 
-        file.save(input_path)
-
         if image:
-            image_path = os.path.join(UPLOAD_FOLDER, secure_filename(image.filename))
-            image.save(image_path)
-            add_image_watermark(input_path, output_path, image_path, position)
+            image_path = save_upload(image)
+            run_tool(add_image_watermark, input_path, output_path, image_path, position,
+                     linearize=want_linearize(), incremental=want_incremental())
         else:
-            add_text_watermark(input_path, output_path, text, position)
+            run_tool(add_text_watermark, input_path, output_path, text, position,
+                     linearize=want_linearize(), incremental=want_incremental())
 
         @after_this_request
         def cleanup(response):
-            for p in (input_path, output_path):
-                if os.path.exists(p): os.remove(p)
-            if image and os.path.exists(image_path): os.remove(image_path)
+            cleanup_files(output_path)
             return response
 
-        return send_file(output_path, as_attachment=True,
-                         download_name=f"{name}_watermarked.pdf")
+        return send_output(output_path, f"{name}_watermarked.pdf")
 
     except Exception as e:
         print("WATERMARK ERROR:", e)
@@ -583,33 +902,31 @@ def add_watermark_route():
 @app.route("/protect-pdf", methods=["POST"])
 def protect_pdf_route():
     try:
-        file = request.files.get("file")
+        input_path, name = get_input()
         password = request.form.get("password")
+        owner_password = request.form.get("owner_password")
+        permissions = request.form.get("permissions")   # e.g. "print,copy"
 
-        if not file or not password:
+        if not input_path or not password:
             return jsonify({"error": "Missing file or password"}), 400
 
-        name = os.path.splitext(secure_filename(file.filename))[0]
+        allowed = permissions.split(",") if permissions is not None else None
 
-        input_path = os.path.join(UPLOAD_FOLDER, file.filename)
         output_path = os.path.join(OUTPUT_FOLDER, f"{name}_protected.pdf")
 
-        file.save(input_path)
-
-        protect_pdf(input_path, output_path, password)
+        try:
+            run_tool(protect_pdf, input_path, output_path, password,
+                     owner_password=owner_password, permissions=allowed,
+                     linearize=want_linearize())
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         @after_this_request
         def cleanup(response):
-            for p in (input_path, output_path):
-                if os.path.exists(p):
-                    os.remove(p)
+            cleanup_files(output_path)
             return response
 
-        return send_file(
-            output_path,
-            as_attachment=True,
-            download_name=f"{name}_protected.pdf"
-        )
+        return send_output(output_path, f"{name}_protected.pdf")
 
     except Exception as e:
         print("PROTECT PDF ERROR:", e)
@@ -620,38 +937,26 @@ def protect_pdf_route():
 @app.route("/unlock-pdf", methods=["POST"])
 def unlock_pdf_route():
     try:
-        file = request.files.get("file")
+        # 📥 Uploaded PDF or stored document
+        input_path, name = get_input()
         password = request.form.get("password")
 
-        if not file or not password:
+        if not input_path or not password:
             return jsonify({"error": "Missing file or password"}), 400
 
-        # 🔐 Safe filename (without extension)
-        name = os.path.splitext(secure_filename(file.filename))[0]
-
-        input_path = os.path.join(UPLOAD_FOLDER, file.filename)
         output_path = os.path.join(OUTPUT_FOLDER, f"{name}_unlocked.pdf")
 
-        # 📥 Save uploaded PDF
-        file.save(input_path)
-
         # 🔓 Unlock PDF
-        unlock_pdf(input_path, output_path, password)
+        run_tool(unlock_pdf, input_path, output_path, password, linearize=want_linearize())
 
         # 🧹 Auto cleanup after response
         @after_this_request
         def cleanup(response):
-            for p in (input_path, output_path):
-                if os.path.exists(p):
-                    os.remove(p)
+            cleanup_files(output_path)
             return response
 
         # 📤 Send unlocked PDF
-        return send_file(
-            output_path,
-            as_attachment=True,
-            download_name=f"{name}_unlocked.pdf"
-        )
+        return send_output(output_path, f"{name}_unlocked.pdf")
 
     except Exception as e:
         print("UNLOCK PDF ERROR:", e)
@@ -662,7 +967,7 @@ def unlock_pdf_route():
 @app.route("/sign-pdf", methods=["POST"])
 def sign_pdf_route():
     try:
-        file = request.files.get("file")
+        in_path, name = get_input()
         text = request.form.get("text")
         image = request.files.get("image")
 
@@ -676,39 +981,35 @@ def sign_pdf_route():
 
         page = request.form.get("page")
 
-        if not file:
+        if not in_path:
             return jsonify({"error":"No PDF"}), 400
 
-        name = os.path.splitext(secure_filename(file.filename))[0]
-        in_path = os.path.join(UPLOAD_FOLDER, file.filename)
         out_path = os.path.join(OUTPUT_FOLDER, f"{name}_signed.pdf")
-        file.save(in_path)
 
         img_path = None
         if image:
-            img_path = os.path.join(UPLOAD_FOLDER, secure_filename(image.filename))
-            image.save(img_path)
+            img_path = save_upload(image)
 
         from tools.sign_pdf import sign_pdf
-        sign_pdf(
+        run_tool(
+            sign_pdf,
             in_path, out_path,
             text=text,
             image_path=img_path,
             page_mode=page_mode,
             page=int(page) if page else None,
             position_mode=position_mode,
-            x=x, y=y, w=w, h=h
+            x=x, y=y, w=w, h=h,
+            linearize=want_linearize(),
+            incremental=want_incremental()
         )
 
         @after_this_request
         def cleanup(resp):
-            for p in (in_path, out_path, img_path):
-                if p and os.path.exists(p):
-                    os.remove(p)
+            cleanup_files(out_path)
             return resp
 
-        return send_file(out_path, as_attachment=True,
-                         download_name=f"{name}_signed.pdf")
+        return send_output(out_path, f"{name}_signed.pdf")
 
     except Exception as e:
         print("SIGN PDF ERROR:", e)
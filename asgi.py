@@ -0,0 +1,197 @@
+"""
+ASGI entry point, alongside the WSGI `app:app`.
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 2
+
+Same routes as app.py: the Flask app is mounted behind a small
+ASGI → WSGI bridge that
+
+- reads the request body on the event loop into a spooled temp file
+  (slow uploads never hold a worker thread),
+- runs the Flask view (and therefore the tools/ functions) in a thread
+  pool sized to the machine (ASGI_WORKERS, default CPU count),
+- streams the response body back chunk by chunk, reading each chunk in
+  a separate I/O pool, so slow downloads don't hold conversion capacity.
+
+Client disconnects close the WSGI response iterator, which also stops
+streaming generators early.
+
+The tool threads share one interpreter. Only tools that shell out (gs,
+soffice, tesseract without tesserocr) or stay in native code (qpdf,
+pdfium, tesserocr) run in parallel. pdf2docx, PyPDF2 sign / watermark,
+openpyxl / reportlab and much of the NumPy preprocessing hold the GIL,
+so one process runs them one at a time. Start uvicorn with --workers N
+(one per core, as with gunicorn's --workers) for parallel work, and
+lower ASGI_WORKERS to match.
+"""
+import os
+import sys
+import asyncio
+import tempfile
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.wsgi import FileWrapper
+
+from app import app as flask_app
+
+ASGI_WORKERS = int(os.environ.get("ASGI_WORKERS", os.cpu_count() or 1))
+IO_WORKERS = int(os.environ.get("ASGI_IO_WORKERS", ASGI_WORKERS * 4))
+CHUNK_SIZE = 256 * 1024
+SPOOL_MAX = 1024 * 1024
+
+_tool_pool = ThreadPoolExecutor(max_workers=ASGI_WORKERS, thread_name_prefix="tool")
+_io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+
+
+def _file_wrapper(f, block_size=CHUNK_SIZE):
+    return FileWrapper(f, max(block_size, CHUNK_SIZE))
+
+
+def _build_environ(scope, body, body_size):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        "wsgi.file_wrapper": _file_wrapper,
+    }
+
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").lower()
+        value = value.decode("latin-1")
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value
+        elif name == "content-length":
+            environ["CONTENT_LENGTH"] = value
+        else:
+            key = "HTTP_" + name.upper().replace("-", "_")
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+
+    # Chunked uploads have no Content-Length; we know the spooled size
+    environ.setdefault("CONTENT_LENGTH", str(body_size))
+    return environ
+
+
+def _call_wsgi(environ):
+    """Run the Flask app (in a tool thread). Returns (status, headers, iterable)."""
+    state = {}
+    written = []
+
+    def start_response(status, headers, exc_info=None):
+        state["status"] = status
+        state["headers"] = headers
+        return written.append
+
+    result = flask_app(environ, start_response)
+    if written:
+        # legacy write() callable users: send those bytes first
+        result = written + list(result)
+    return state["status"], state["headers"], result
+
+
+async def _read_body(receive):
+    """Spool the request body; None if the client went away."""
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX)
+    size = 0
+    more = True
+    while more:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            body.close()
+            return None, 0
+        chunk = message.get("body", b"")
+        if chunk:
+            body.write(chunk)
+            size += len(chunk)
+        more = message.get("more_body", False)
+    body.seek(0)
+    return body, size
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            _tool_pool.shutdown(wait=False, cancel_futures=True)
+            _io_pool.shutdown(wait=False, cancel_futures=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def _stream_response(loop, ctx, receive, send, status, headers, result):
+    # Watch for the client going away while we stream the response
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+                return
+
+    watcher = loop.create_task(watch_disconnect())
+    iterator = ctx.run(iter, result)
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": int(status.split(" ", 1)[0]),
+            "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+        })
+
+        while not disconnected.is_set():
+            chunk = await loop.run_in_executor(_io_pool, ctx.run, next, iterator, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+        if not disconnected.is_set():
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    finally:
+        watcher.cancel()
+        close = getattr(result, "close", None)
+        if close is not None:
+            # runs response cleanup / stops generators on disconnect
+            await loop.run_in_executor(_io_pool, ctx.run, close)
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    loop = asyncio.get_running_loop()
+
+    body, size = await _read_body(receive)
+    if body is None:
+        return
+
+    # One context per request for the view call, every chunk and close():
+    # stream_with_context() pushes Flask's request context inside the view
+    # and pops it after the last chunk, on whichever thread is free then,
+    # which only works if all of them see the same context variables.
+    ctx = contextvars.copy_context()
+    try:
+        environ = _build_environ(scope, body, size)
+        status, headers, result = await loop.run_in_executor(_tool_pool, ctx.run, _call_wsgi, environ)
+        await _stream_response(loop, ctx, receive, send, status, headers, result)
+    finally:
+        body.close()
@@ -0,0 +1,109 @@
+"""
+PDF → Word benchmark: pdf2docx layout mode vs. text-flow mode.
+
+    python benchmarks/bench_pdf_to_word.py --pages 50 --runs 3
+    python benchmarks/bench_pdf_to_word.py --input some.pdf
+
+Every run converts in a fresh process so peak RSS is per mode.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from reportlab.pdfgen import canvas
+from docx import Document
+
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+         "tempor incididunt ut labore et dolore magna aliqua").split()
+
+
+def make_pdf(path, pages):
+    """Report-like pages: heading, body paragraphs and a ruled table."""
+    c = canvas.Canvas(path)
+    for i in range(pages):
+        c.setFont("Helvetica-Bold", 18)
+        c.drawString(60, 790, f"Section {i + 1}")
+        c.setFont("Helvetica", 10)
+        y = 760
+        for para in range(4):
+            for line in range(5):
+                words = [WORDS[(i + para + line + k) % len(WORDS)] for k in range(14)]
+                c.drawString(60, y, " ".join(words))
+                y -= 13
+            y -= 10
+
+        # 6 x 4 ruled table
+        top, row_h, col_w = y - 10, 18, 110
+        for r in range(7):
+            c.line(60, top - r * row_h, 60 + 4 * col_w, top - r * row_h)
+        for col in range(5):
+            c.line(60 + col * col_w, top, 60 + col * col_w, top - 6 * row_h)
+        for r in range(6):
+            for col in range(4):
+                text = f"Item {r}" if col == 0 else f"{(i + 1) * (r + 1) * (col + 1):,}.00"
+                c.drawString(64 + col * col_w, top - r * row_h - 13, text)
+        c.showPage()
+    c.save()
+
+
+CHILD = """
+import sys, time
+sys.path.insert(0, {root!r})
+from tools.pdf_to_word import pdf_to_word
+t = time.perf_counter()
+pdf_to_word({src!r}, {out!r}, mode={mode!r})
+print(time.perf_counter() - t)
+"""
+
+
+def run_mode(src, out, mode):
+    """(seconds, peak RSS MB) of one conversion in a child process."""
+    code = CHILD.format(root=ROOT, src=src, out=out, mode=mode)
+    proc = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    stdout = proc.stdout.read()
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{mode} conversion failed")
+    return float(stdout.decode().strip().splitlines()[-1]), usage.ru_maxrss / 1024
+
+
+def describe(docx_path):
+    doc = Document(docx_path)
+    headings = sum(1 for p in doc.paragraphs if p.style.name.startswith("Heading"))
+    return f"{len(doc.paragraphs)} paragraphs ({headings} headings), {len(doc.tables)} tables"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=50)
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--input", help="benchmark this PDF instead of a generated one")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = args.input or os.path.join(tmp, "input.pdf")
+        if not args.input:
+            make_pdf(src, args.pages)
+
+        results = {}
+        for mode in ("layout", "text"):
+            out = os.path.join(tmp, f"{mode}.docx")
+            runs = [run_mode(src, out, mode) for _ in range(args.runs)]
+            results[mode] = (min(r[0] for r in runs), max(r[1] for r in runs), describe(out))
+
+        print(f"{os.path.basename(src)}, best of {args.runs} runs")
+        print(f"{'mode':<8}{'seconds':>10}{'peak MB':>10}  output")
+        for mode, (seconds, rss, desc) in results.items():
+            print(f"{mode:<8}{seconds:>10.3f}{rss:>10.0f}  {desc}")
+        print(f"text mode speedup: {results['layout'][0] / results['text'][0]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
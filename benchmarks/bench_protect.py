@@ -0,0 +1,92 @@
+"""
+Protect / unlock benchmark: old PyPDF2 page-copy path vs pikepdf (qpdf).
+
+    python benchmarks/bench_protect.py --pages 1000 --runs 3
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfReader, PdfWriter
+from reportlab.pdfgen import canvas
+
+from tools.protect_pdf import protect_pdf
+from tools.unlock_pdf import unlock_pdf
+
+
+def make_pdf(path, pages):
+    c = canvas.Canvas(path)
+    for i in range(pages):
+        c.setFont("Helvetica", 12)
+        for line in range(40):
+            c.drawString(60, 780 - line * 18, f"Page {i + 1} line {line + 1} lorem ipsum dolor sit amet")
+        c.rect(50, 50, 480, 700)
+        c.showPage()
+    c.save()
+
+
+# ===== Previous implementations (PyPDF2, RC4-era 128 bit) =====
+def protect_pypdf2(input_path, output_path, password):
+    reader = PdfReader(input_path)
+    writer = PdfWriter()
+    for page in reader.pages:
+        writer.add_page(page)
+    writer.encrypt(user_password=password, owner_password=password, use_128bit=True)
+    with open(output_path, "wb") as f:
+        writer.write(f)
+
+
+def unlock_pypdf2(input_path, output_path, password):
+    reader = PdfReader(input_path)
+    if reader.is_encrypted:
+        reader.decrypt(password)
+    writer = PdfWriter()
+    for page in reader.pages:
+        writer.add_page(page)
+    with open(output_path, "wb") as f:
+        writer.write(f)
+
+
+def timed(fn, runs, *args):
+    best = None
+    for _ in range(runs):
+        t = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=1000)
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "input.pdf")
+        make_pdf(src, args.pages)
+
+        old_locked = os.path.join(tmp, "old_locked.pdf")
+        new_locked = os.path.join(tmp, "new_locked.pdf")
+        out = os.path.join(tmp, "out.pdf")
+
+        rows = [
+            ("protect", timed(protect_pypdf2, args.runs, src, old_locked, "pw"),
+                        timed(protect_pdf, args.runs, src, new_locked, "pw")),
+            ("unlock", timed(unlock_pypdf2, args.runs, old_locked, out, "pw"),
+                       timed(unlock_pdf, args.runs, new_locked, out, "pw")),
+        ]
+
+        print(f"{args.pages} pages, best of {args.runs} runs, input {os.path.getsize(src)} bytes")
+        print(f"{'op':<10}{'PyPDF2 (s)':>12}{'pikepdf (s)':>13}{'speedup':>10}")
+        for op, old, new in rows:
+            print(f"{op:<10}{old:>12.3f}{new:>13.3f}{old / new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+"""
+Load test: replay a weighted mix of routes against the API at a target rate.
+
+Starts the app locally (gunicorn / uvicorn / flask dev server), generates
+test documents, drives the mix open-loop (requests are sent on schedule,
+not when the previous one finishes) and reports per-route p50/p95/p99
+latency, errors and throughput plus server CPU / RSS over time.
+
+    python benchmarks/loadtest.py --rate 4 --duration 60 \\
+        --mix compress-pdf=4,rotate-pdf=3,ocr-pdf=1,word-to-pdf=1
+
+    # against an already running server (no resource sampling)
+    python benchmarks/loadtest.py --url http://localhost:10000 --rate 2
+
+Latency is measured from the *scheduled* send time, so time a request
+spent waiting for a free client slot counts (no coordinated omission);
+"service" is the time the server actually took.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from reportlab.pdfgen import canvas
+from PIL import Image, ImageDraw
+
+DEFAULT_MIX = ("compress-pdf=4,rotate-pdf=2,merge-pdf=2,split-pdf=1,protect-pdf=1,"
+               "pdf-to-image=1,word-to-pdf=1,excel-to-pdf=1,ocr-pdf=1")
+SAMPLE_INTERVAL = 1.0
+
+
+# ===== Test documents =====
+def make_text_pdf(path, pages):
+    c = canvas.Canvas(path)
+    for i in range(pages):
+        c.setFont("Helvetica", 11)
+        for line in range(45):
+            c.drawString(60, 790 - line * 16, f"Page {i + 1} line {line + 1} lorem ipsum dolor sit amet")
+        c.showPage()
+    c.save()
+
+
+def make_table_pdf(path, pages):
+    c = canvas.Canvas(path)
+    for i in range(pages):
+        c.setFont("Helvetica", 10)
+        for r in range(30):
+            y = 780 - r * 20
+            for col, x in enumerate((60, 200, 340, 480)):
+                c.rect(x - 5, y - 6, 140, 20)
+                c.drawString(x, y, f"R{i * 30 + r} C{col}" if r else f"Header {col}")
+        c.showPage()
+    c.save()
+
+
+def make_scan_pdf(path, pages):
+    """Text rendered into 200 dpi images, i.e. a scanned document."""
+    images = []
+    for i in range(pages):
+        img = Image.new("L", (1654, 2339), 255)
+        d = ImageDraw.Draw(img)
+        for line in range(40):
+            d.text((150, 150 + line * 50), f"Scanned page {i + 1} line {line + 1} lorem ipsum", fill=0)
+        images.append(img)
+    images[0].save(path, "PDF", resolution=200, save_all=True, append_images=images[1:])
+
+
+def make_docx(path, pages):
+    from docx import Document
+    doc = Document()
+    for i in range(pages):
+        doc.add_heading(f"Section {i + 1}", level=1)
+        for _ in range(12):
+            doc.add_paragraph("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 3)
+        doc.add_page_break()
+    doc.save(path)
+
+
+def make_xlsx(path, pages):
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Id", "Name", "Qty", "Price", "Date"])
+    for r in range(pages * 60):
+        ws.append([r, f"Item {r}", r % 17, round(r * 1.37, 2), f"2024-01-{r % 28 + 1:02d}"])
+    wb.save(path)
+
+
+def make_png(path):
+    img = Image.new("RGBA", (300, 120), (0, 0, 0, 0))
+    ImageDraw.Draw(img).text((20, 50), "Signed", fill=(0, 0, 160, 255))
+    img.save(path)
+
+
+def make_fixtures(folder, pages):
+    f = {
+        "pdf": os.path.join(folder, "text.pdf"),
+        "table_pdf": os.path.join(folder, "table.pdf"),
+        "scan_pdf": os.path.join(folder, "scan.pdf"),
+        "locked_pdf": os.path.join(folder, "locked.pdf"),
+        "docx": os.path.join(folder, "doc.docx"),
+        "xlsx": os.path.join(folder, "sheet.xlsx"),
+        "png": os.path.join(folder, "sign.png"),
+    }
+    make_text_pdf(f["pdf"], pages)
+    make_table_pdf(f["table_pdf"], pages)
+    make_scan_pdf(f["scan_pdf"], max(1, pages // 4))
+    make_docx(f["docx"], pages)
+    make_xlsx(f["xlsx"], pages)
+    make_png(f["png"])
+
+    import pikepdf
+    with pikepdf.open(f["pdf"]) as pdf:
+        pdf.save(f["locked_pdf"], encryption=pikepdf.Encryption(user="secret", owner="secret", R=6))
+    return f
+
+
+# route → (files [(field, fixture)], form fields)
+ROUTES = {
+    "compress-pdf": ([("file", "pdf")], {"level": "balanced"}),
+    "rotate-pdf": ([("file", "pdf")], {"rotation": "90"}),
+    "merge-pdf": ([("files", "pdf"), ("files", "pdf")], {}),
+    "split-pdf": ([("file", "pdf")], {"pages": "1,2"}),
+    "remove-pages": ([("file", "pdf")], {"pages": "1"}),
+    "organize-pdf": ([("file", "pdf")], {"order": "2,1"}),
+    "protect-pdf": ([("file", "pdf")], {"password": "secret"}),
+    "unlock-pdf": ([("file", "locked_pdf")], {"password": "secret"}),
+    "add-watermark": ([("file", "pdf")], {"text": "DRAFT"}),
+    "sign-pdf": ([("file", "pdf"), ("image", "png")],
+                 {"page_mode": "all", "position_mode": "same",
+                  "x": "0.6", "y": "0.05", "w": "0.3", "h": "0.1"}),
+    "repair-pdf": ([("file", "pdf")], {}),
+    "pdf-to-image": ([("file", "pdf")], {}),
+    "thumbnails": ([("file", "pdf")], {"last": "4"}),
+    "pdf-to-word": ([("file", "pdf")], {}),
+    "pdf-to-excel": ([("file", "table_pdf")], {}),
+    "word-to-pdf": ([("file", "docx")], {}),
+    "excel-to-pdf": ([("file", "xlsx")], {}),
+    "ocr-pdf": ([("file", "scan_pdf")], {"type": "text"}),
+}
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.strip().partition("=")
+        name = name.strip().strip("/")
+        if name not in ROUTES:
+            raise SystemExit(f"Unknown route in --mix: {name} (known: {', '.join(ROUTES)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+# ===== HTTP =====
+def encode_multipart(files, fields, fixtures, cache):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for field, key in files:
+        if key not in cache:
+            with open(fixtures[key], "rb") as f:
+                cache[key] = f.read()
+        filename = os.path.basename(fixtures[key])
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n".encode() + cache[key] + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def send(url, body, content_type, timeout):
+    """POST and read the whole response. Returns (status, bytes)."""
+    req = urllib.request.Request(url, data=body, method="POST",
+                                 headers={"Content-Type": content_type})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, len(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, len(e.read() or b"")
+    except Exception as e:
+        return type(e).__name__, 0
+
+
+# ===== Server =====
+def start_server(kind, port, workers):
+    env = dict(os.environ, PORT=str(port))
+    if kind == "gunicorn":
+        cmd = [sys.executable, "-m", "gunicorn", "app:app", "-b", f"127.0.0.1:{port}",
+               "-w", str(workers), "--timeout", "300"]
+    elif kind == "uvicorn":
+        env["ASGI_WORKERS"] = str(workers)
+        cmd = [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1",
+               "--port", str(port), "--log-level", "warning"]
+    else:
+        cmd = [sys.executable, "-c",
+               f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"]
+
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"{kind} exited with code {proc.returncode}")
+        try:
+            urllib.request.urlopen(url + "/", timeout=1).close()
+            return proc, url
+        except Exception:
+            time.sleep(0.3)
+    proc.kill()
+    raise SystemExit(f"{kind} did not come up on {url}")
+
+
+def _proc_tree(pid):
+    """pid plus all descendants, from /proc."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    tree, todo = [], [pid]
+    while todo:
+        p = todo.pop()
+        tree.append(p)
+        todo.extend(children.get(p, []))
+    return tree
+
+
+def _cpu_rss(pids):
+    ticks = os.sysconf("SC_CLK_TCK")
+    page = os.sysconf("SC_PAGE_SIZE")
+    cpu = rss = 0
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / ticks
+            rss += int(fields[21]) * page
+        except (OSError, IndexError, ValueError):
+            pass
+    return cpu, rss
+
+
+class ResourceSampler(threading.Thread):
+    """Samples CPU% and RSS of the server process tree every second."""
+
+    def __init__(self, pid, in_flight):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.in_flight = in_flight
+        self.samples = []
+        self._done = threading.Event()
+
+    def run(self):
+        start = time.time()
+        last_t, (last_cpu, _) = start, _cpu_rss(_proc_tree(self.pid))
+        while not self._done.wait(SAMPLE_INTERVAL):
+            pids = _proc_tree(self.pid)
+            now = time.time()
+            cpu, rss = _cpu_rss(pids)
+            self.samples.append({
+                "t": round(now - start, 1),
+                "cpu_pct": round(100 * (cpu - last_cpu) / (now - last_t), 1),
+                "rss_mb": round(rss / 1e6, 1),
+                "processes": len(pids),
+                "in_flight": self.in_flight(),
+            })
+            last_t, last_cpu = now, cpu
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+# ===== Load generation =====
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def run_load(url, mix, fixtures, rate, duration, concurrency, timeout, poisson, seed, in_flight):
+    """Send on schedule; returns (pool still draining, results list, start time)."""
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[n] for n in names]
+
+    cache = {}
+    bodies = {n: encode_multipart(*ROUTES[n], fixtures, cache) for n in names}
+
+    results = []
+    lock = threading.Lock()
+
+    def one(name, scheduled):
+        started = time.time()
+        body, ctype = bodies[name]
+        status, size = send(f"{url}/{name}", body, ctype, timeout)
+        done = time.time()
+        with lock:
+            in_flight[0] -= 1
+            results.append({
+                "route": name, "status": status, "bytes": size,
+                "latency": done - scheduled, "service": done - started, "at": done,
+            })
+
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    start = time.time()
+    t = 0.0
+    while t < duration:
+        delay = start + t - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        name = rng.choices(names, weights)[0]
+        with lock:
+            in_flight[0] += 1
+        pool.submit(one, name, start + t)
+        t += rng.expovariate(rate) if poisson else 1.0 / rate
+
+    return pool, results, start
+
+
+def summarize(results, elapsed):
+    routes = {}
+    for r in results:
+        routes.setdefault(r["route"], []).append(r)
+
+    report = {}
+    for name, rs in sorted(routes.items()) + [("ALL", results)]:
+        ok = [r for r in rs if r["status"] == 200]
+        lat = [r["latency"] * 1000 for r in ok]
+        errors = {}
+        for r in rs:
+            if r["status"] != 200:
+                errors[str(r["status"])] = errors.get(str(r["status"]), 0) + 1
+        report[name] = {
+            "requests": len(rs),
+            "ok": len(ok),
+            "errors": errors,
+            "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else 0,
+            "p50_ms": round(percentile(lat, 50), 1),
+            "p95_ms": round(percentile(lat, 95), 1),
+            "p99_ms": round(percentile(lat, 99), 1),
+            "max_ms": round(max(lat), 1) if lat else 0,
+            "service_p50_ms": round(percentile([r["service"] * 1000 for r in ok], 50), 1),
+        }
+    return report
+
+
+def print_report(report, samples):
+    print(f"\n{'route':<16}{'req':>6}{'ok':>6}{'err':>6}{'rps':>8}"
+          f"{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  errors")
+    for name, r in report.items():
+        err = sum(r["errors"].values())
+        print(f"{name:<16}{r['requests']:>6}{r['ok']:>6}{err:>6}{r['throughput_rps']:>8.2f}"
+              f"{r['p50_ms']:>9.0f}{r['p95_ms']:>9.0f}{r['p99_ms']:>9.0f}{r['max_ms']:>9.0f}"
+              f"  {r['errors'] or ''}")
+    print("(latency in ms, from scheduled send time)")
+
+    if samples:
+        print(f"\n{'t(s)':>6}{'cpu%':>8}{'rss MB':>9}{'procs':>7}{'in-flight':>11}")
+        step = max(1, len(samples) // 30)
+        for s in samples[::step]:
+            print(f"{s['t']:>6}{s['cpu_pct']:>8}{s['rss_mb']:>9}{s['processes']:>7}{s['in_flight']:>11}")
+        print(f"peak cpu {max(s['cpu_pct'] for s in samples)}%, "
+              f"peak rss {max(s['rss_mb'] for s in samples)} MB")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--url", help="target an already running server instead of starting one")
+    ap.add_argument("--server", choices=("gunicorn", "uvicorn", "flask"), default="gunicorn")
+    ap.add_argument("--workers", type=int, default=2, help="gunicorn workers / ASGI_WORKERS")
+    ap.add_argument("--port", type=int, default=10099)
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="route=weight,... (default: %(default)s)")
+    ap.add_argument("--rate", type=float, default=2.0, help="requests per second")
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds of sending")
+    ap.add_argument("--concurrency", type=int, default=32, help="max requests in flight")
+    ap.add_argument("--timeout", type=float, default=300.0)
+    ap.add_argument("--pages", type=int, default=10, help="pages per generated document")
+    ap.add_argument("--poisson", action="store_true", help="exponential inter-arrival times")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", help="write the full report here")
+    args = ap.parse_args()
+
+    mix = parse_mix(args.mix)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print("Generating documents...")
+        fixtures = make_fixtures(tmp, args.pages)
+
+        proc = None
+        url = args.url.rstrip("/") if args.url else None
+        if not url:
+            print(f"Starting {args.server} ({args.workers} workers)...")
+            proc, url = start_server(args.server, args.port, args.workers)
+
+        sampler = None
+        try:
+            print(f"Driving {args.rate} req/s for {args.duration}s against {url}")
+            in_flight = [0]
+            if proc:
+                sampler = ResourceSampler(proc.pid, lambda: in_flight[0])
+                sampler.start()
+            pool, results, start = run_load(
+                url, mix, fixtures, args.rate, args.duration, args.concurrency,
+                args.timeout, args.poisson, args.seed, in_flight
+            )
+            pool.shutdown(wait=True)
+            elapsed = time.time() - start
+        finally:
+            if sampler:
+                sampler.stop()
+            if proc:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+
+    report = summarize(results, elapsed)
+    samples = sampler.samples if sampler else []
+    print_report(report, samples)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "routes": report, "resources": samples}, f, indent=2)
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import io
+import re
+
+import pikepdf
+from PIL import Image
+from reportlab.pdfgen import canvas
+
+from tools.add_watermark import add_image_watermark
+from tools.incremental import OVERLAY_NAME
+
+INFLATED_SIZE = 300
+
+
+def _inflated_pdf(path):
+    """
+    Two-page PDF with an xref table padded with free entries, so the
+    trailer's /Size (300) is far above the highest object number.
+    """
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf)
+    for n in range(2):
+        c.drawString(100, 700, f"page {n + 1}")
+        c.showPage()
+    c.save()
+
+    plain = io.BytesIO()
+    with pikepdf.open(buf) as pdf:
+        pdf.save(plain, object_stream_mode=pikepdf.ObjectStreamMode.disable)
+    data = plain.getvalue()
+
+    count = int(re.search(rb"\nxref\n0 (\d+)\n", data).group(1))
+    free = b"0000000000 65535 f \n" * (INFLATED_SIZE - count)
+    head, sep, rest = data.partition(b"\ntrailer")
+    data = head.replace(f"\nxref\n0 {count}\n".encode(), f"\nxref\n0 {INFLATED_SIZE}\n".encode())
+    data += b"\n" + free.rstrip(b"\n") + sep + rest.replace(f"/Size {count}".encode(),
+                                                           f"/Size {INFLATED_SIZE}".encode())
+    with open(path, "wb") as f:
+        f.write(data)
+    return count
+
+
+def test_overlay_objects_below_trailer_size_are_appended(tmp_path):
+    src, out, logo = tmp_path / "in.pdf", tmp_path / "out.pdf", tmp_path / "logo.png"
+    highest = _inflated_pdf(src)
+    with pikepdf.open(src) as pdf:
+        assert int(pdf.trailer.Size) == INFLATED_SIZE
+        assert max(o.objgen[0] for o in pdf.objects) < highest
+        assert not pdf.get_warnings()
+    Image.new("RGB", (64, 64), (200, 30, 30)).save(logo)
+
+    add_image_watermark(str(src), str(out), str(logo), "center", incremental=True)
+
+    original = src.read_bytes()
+    assert out.read_bytes().startswith(original)
+    with pikepdf.open(out) as pdf:
+        for page in pdf.pages:
+            form = page.Resources.XObject["/" + OVERLAY_NAME]
+            assert form.objgen[0] < INFLATED_SIZE
+            images = form.Resources.XObject
+            assert images.keys()
+            for name in images.keys():
+                assert isinstance(images[name], pikepdf.Stream), name
+        assert not pdf.check()
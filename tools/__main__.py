@@ -0,0 +1,320 @@
+"""
+Offline batch runner for the tools, no HTTP involved.
+
+    python -m tools list
+    python -m tools compress scans/ -o out/ -p level=high --workers 4
+    python -m tools ocr "inbox/*.pdf" -o out/ -p output_type=pdf
+    python -m tools watermark contracts/ -o out/ -p text=DRAFT -p position=diagonal
+    python -m tools merge part1.pdf parts/ -o merged.pdf
+
+Inputs are files, directories (--recursive to descend) or glob patterns.
+-p key=value parameters are passed to the tool function by name
+(see `python -m tools list`). Outputs mirror each input's path below
+the directory / glob it was found through (docs/a/x.pdf given as docs/
+→ <out>/a/x_...). Outputs are written atomically, inputs
+whose output is newer than the input are skipped (--force to redo), so
+re-running after an interruption resumes where it stopped. A JSON
+report of timings and failures is rewritten after every file
+(default: <output dir>/batch-report.json).
+"""
+import os
+import sys
+import glob
+import json
+import time
+import uuid
+import inspect
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tools.jobs import resolve_tool
+
+PDF = (".pdf",)
+
+# CLI name → (tool function, input extensions, output suffix)
+COMMANDS = {
+    "compress": ("compress_pdf", PDF, "_compressed.pdf"),
+    "repair": ("repair_pdf", PDF, "_repaired.pdf"),
+    "ocr": ("run_ocr", PDF + (".jpg", ".jpeg", ".png", ".bmp", ".webp"), None),
+    "word-to-pdf": ("word_to_pdf", (".doc", ".docx", ".odt", ".rtf"), ".pdf"),
+    "pdf-to-word": ("pdf_to_word", PDF, ".docx"),
+    "excel-to-pdf": ("excel_to_pdf", (".xls", ".xlsx", ".xlsm", ".csv", ".ods"), ".pdf"),
+    "pdf-to-excel": ("pdf_to_excel", PDF, ".xlsx"),
+    "pdf-to-image": ("pdf_to_image", PDF, "_images.zip"),
+    "rotate": ("rotate_pdf", PDF, "_rotated.pdf"),
+    "watermark": ("add_text_watermark", PDF, "_watermarked.pdf"),
+    "protect": ("protect_pdf", PDF, "_protected.pdf"),
+    "unlock": ("unlock_pdf", PDF, "_unlocked.pdf"),
+    "sign": ("sign_pdf", PDF, "_signed.pdf"),
+    "split": ("split_pdf_to_zip", PDF, "_split.zip"),
+    "remove-pages": ("remove_pages", PDF, "_removed.pdf"),
+    "organize": ("organize_pdf", PDF, "_organized.pdf"),
+    "merge": ("merge_pdf", PDF, None),     # all inputs → one output file
+}
+
+LIST_PARAMS = {"pages", "pages_to_delete", "order", "permissions"}
+
+
+def _output_suffix(command, params):
+    if command == "ocr":
+        return "_ocr.pdf" if params.get("output_type") == "pdf" else "_ocr.txt"
+    return COMMANDS[command][2]
+
+
+def _tool_function(command, params):
+    name = COMMANDS[command][0]
+    if command == "watermark" and "image_path" in params:
+        name = "add_image_watermark"
+    return name
+
+
+def parse_value(key, value):
+    if key in LIST_PARAMS:
+        items = [v.strip() for v in value.split(",") if v.strip()]
+        return [int(v) if v.lstrip("-").isdigit() else v for v in items]
+    if value.lower() in ("true", "yes", "on"):
+        return True
+    if value.lower() in ("false", "no", "off"):
+        return False
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def parse_params(pairs):
+    params = {}
+    for pair in pairs or []:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"Parameter must be key=value: {pair}")
+        params[key.strip()] = parse_value(key.strip(), value)
+    return params
+
+
+def check_params(fn, params):
+    """Fail early on names the tool doesn't take / required ones missing."""
+    sig = inspect.signature(fn)
+    names = list(sig.parameters)[2:]       # after input, output
+    unknown = [k for k in params if k not in names]
+    if unknown:
+        raise SystemExit(f"{fn.__name__} has no parameter {', '.join(unknown)} (takes: {', '.join(names)})")
+    missing = [n for n in names if sig.parameters[n].default is inspect.Parameter.empty and n not in params]
+    if missing:
+        raise SystemExit(f"{fn.__name__} needs -p {' -p '.join(m + '=...' for m in missing)}")
+
+
+def _glob_root(pattern):
+    """Directory part of a glob pattern before the first wildcard."""
+    parts = []
+    for part in os.path.dirname(pattern).split(os.sep):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return os.sep.join(parts) or "."
+
+
+def expand_inputs(patterns, extensions, recursive=False):
+    """
+    [(path, relative path)] for every matching file. The relative path is
+    taken from the directory (or glob root) the file was found through,
+    so outputs can mirror the input tree.
+    """
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            if recursive:
+                paths = [os.path.join(root, f) for root, _, files in os.walk(pattern) for f in files]
+            else:
+                paths = [os.path.join(pattern, f) for f in os.listdir(pattern)]
+            base = pattern
+        elif os.path.isfile(pattern):
+            paths = [pattern]
+            base = os.path.dirname(pattern)
+        else:
+            paths = glob.glob(pattern, recursive=recursive)
+            base = _glob_root(pattern)
+        found.extend((p, os.path.relpath(p, base or ".")) for p in paths
+                     if os.path.isfile(p) and p.lower().endswith(extensions))
+
+    seen, result = set(), []
+    for p, rel in sorted(found):
+        key = os.path.abspath(p)
+        if key not in seen:
+            seen.add(key)
+            result.append((p, rel))
+    return result
+
+
+def up_to_date(inputs, output):
+    if not os.path.exists(output):
+        return False
+    out_mtime = os.path.getmtime(output)
+    return all(os.path.getmtime(p) <= out_mtime for p in inputs)
+
+
+def run_one(tool_name, input_arg, output_path, params):
+    """Worker process: run the tool into a temp name, then move it in place."""
+    root, ext = os.path.splitext(output_path)
+    part = f"{root}.{uuid.uuid4().hex[:12]}.part{ext}"
+    started = time.time()
+    try:
+        fn = resolve_tool(tool_name)
+        result = fn(input_arg, part, **params)
+        if not os.path.exists(part):
+            raise RuntimeError("Tool produced no output")
+        os.replace(part, output_path)
+    finally:
+        if os.path.exists(part):
+            os.remove(part)
+    return time.time() - started, result
+
+
+class Report:
+    """JSON report, rewritten atomically after every finished item."""
+
+    def __init__(self, path, command, params, workers):
+        self.path = path
+        self.items = {}
+        previous = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    previous = json.load(f)
+            except (OSError, ValueError):
+                previous = {}
+        if previous.get("command") == command:
+            # Resume: keep what earlier runs recorded
+            self.items = {i["input"]: i for i in previous.get("items", [])}
+        self.data = {"command": command, "params": params, "workers": workers,
+                     "started": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+    def record(self, item):
+        self.items[item["input"]] = item
+        self.save()
+
+    def save(self, finished=False):
+        items = list(self.items.values())
+        summary = {"ok": 0, "failed": 0, "skipped": 0, "seconds": 0.0}
+        for i in items:
+            summary[i["status"]] = summary.get(i["status"], 0) + 1
+            summary["seconds"] += i.get("seconds") or 0
+        summary["seconds"] = round(summary["seconds"], 3)
+        data = dict(self.data, summary=summary, items=items)
+        if finished:
+            data["finished"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2, default=str)
+        os.replace(tmp, self.path)
+        return summary
+
+
+def list_tools():
+    for command, (name, exts, _) in COMMANDS.items():
+        fn = resolve_tool(name)
+        params = list(inspect.signature(fn).parameters.values())[2:]
+        shown = " ".join(p.name if p.default is inspect.Parameter.empty else f"[{p.name}={p.default!r}]"
+                         for p in params)
+        print(f"{command:<14} {' '.join(exts):<36} {shown}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m tools", description="Run a tool over many files.")
+    ap.add_argument("command", choices=list(COMMANDS) + ["list"])
+    ap.add_argument("inputs", nargs="*", help="files, directories or glob patterns")
+    ap.add_argument("-o", "--output", help="output directory (merge: output file)")
+    ap.add_argument("-p", "--param", action="append", metavar="KEY=VALUE", help="tool parameter")
+    ap.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("-r", "--recursive", action="store_true")
+    ap.add_argument("--force", action="store_true", help="redo inputs whose output is up to date")
+    ap.add_argument("--report", help="JSON report path (default: <output dir>/batch-report.json)")
+    args = ap.parse_args(argv)
+
+    if args.command == "list":
+        list_tools()
+        return 0
+    if not args.inputs or not args.output:
+        ap.error("inputs and -o/--output are required")
+
+    params = parse_params(args.param)
+    tool_name = _tool_function(args.command, params)
+    check_params(resolve_tool(tool_name), params)
+    found = expand_inputs(args.inputs, COMMANDS[args.command][1], args.recursive)
+    if not found:
+        print("No matching input files.")
+        return 1
+    inputs = [p for p, _ in found]
+
+    # Work list: (key, input argument, output path, input files)
+    if args.command == "merge":
+        out_dir = os.path.dirname(os.path.abspath(args.output))
+        tasks = [(args.output, inputs, args.output, inputs)]
+    else:
+        out_dir = args.output
+        suffix = _output_suffix(args.command, params)
+        tasks = [(p, p, os.path.join(out_dir, os.path.splitext(rel)[0] + suffix), [p])
+                 for p, rel in found]
+
+        # e.g. a/d.pdf and b/d.pdf given as two separate file arguments
+        by_output = {}
+        for key, _, out, _ in tasks:
+            by_output.setdefault(os.path.abspath(out), []).append(key)
+        clashes = [keys for keys in by_output.values() if len(keys) > 1]
+        if clashes:
+            raise SystemExit("Inputs would write the same output file: "
+                             + "; ".join(" / ".join(keys) for keys in clashes))
+
+    os.makedirs(out_dir, exist_ok=True)
+    for _, _, out, _ in tasks:
+        os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+
+    report = Report(args.report or os.path.join(out_dir, "batch-report.json"),
+                    args.command, params, args.workers)
+
+    todo = []
+    for key, arg, out, srcs in tasks:
+        if not args.force and up_to_date(srcs, out):
+            if report.items.get(key, {}).get("status") != "ok":
+                report.items[key] = {"input": key, "output": out, "status": "skipped"}
+        else:
+            todo.append((key, arg, out))
+    report.save()
+    print(f"{args.command}: {len(todo)} to run, {len(tasks) - len(todo)} up to date, {args.workers} workers")
+
+    interrupted = False
+    pool = ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(todo) or 1)))
+    try:
+        futures = {pool.submit(run_one, tool_name, arg, out, params): (key, out)
+                   for key, arg, out in todo}
+        for n, fut in enumerate(as_completed(futures), start=1):
+            key, out = futures[fut]
+            try:
+                seconds, result = fut.result()
+                item = {"input": key, "output": out, "status": "ok", "seconds": round(seconds, 3)}
+                if result is not None and not isinstance(result, str):
+                    item["result"] = result
+                print(f"[{n}/{len(todo)}] ok     {key} ({seconds:.2f}s)")
+            except Exception as e:
+                item = {"input": key, "output": out, "status": "failed", "error": str(e)}
+                print(f"[{n}/{len(todo)}] FAILED {key}: {e}")
+            report.record(item)
+    except KeyboardInterrupt:
+        interrupted = True
+        print("Interrupted, finished items are kept; re-run the same command to resume.")
+        pool.shutdown(wait=False, cancel_futures=True)
+    else:
+        pool.shutdown()
+
+    summary = report.save(finished=not interrupted)
+    print(f"ok {summary['ok']}, failed {summary['failed']}, skipped {summary['skipped']} "
+          f"→ {report.path}")
+    if interrupted:
+        return 130
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
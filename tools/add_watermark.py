@@ -1,9 +1,11 @@
+import io
 from PyPDF2 import PdfReader, PdfWriter
 from reportlab.pdfgen import canvas
 from reportlab.lib.colors import Color
 from reportlab.lib.pagesizes import A4
-import tempfile
 from PIL import Image
+from tools.pdf_output import write_pdf
+from tools.incremental import overlay_pages_incremental
 
 def _draw_position(c, w, h, position):
     if position == "center":
@@ -12,56 +14,64 @@ def _draw_position(c, w, h, position):
         return w-120, 80, 0
     return w/2, h/2, 45   # diagonal default
 
-def add_text_watermark(input_pdf, output_pdf, text, position):
-    reader = PdfReader(input_pdf)
-    writer = PdfWriter()
+def _text_overlay(text, position):
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    w,h = A4
 
-    for page in reader.pages:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            c = canvas.Canvas(tmp.name, pagesize=A4)
-            w,h = A4
+    x,y,angle = _draw_position(c,w,h,position)
+    c.setFillColor(Color(1,1,1,alpha=0.15))
+    c.setFont("Helvetica-Bold", 42)
 
-            x,y,angle = _draw_position(c,w,h,position)
-            c.setFillColor(Color(1,1,1,alpha=0.15))
-            c.setFont("Helvetica-Bold", 42)
+    c.saveState()
+    c.translate(x,y)
+    c.rotate(angle)
+    c.drawCentredString(0,0,text)
+    c.restoreState()
+    c.save()
+    return buf.getvalue()
 
-            c.saveState()
-            c.translate(x,y)
-            c.rotate(angle)
-            c.drawCentredString(0,0,text)
-            c.restoreState()
-            c.save()
+def _image_overlay(image_path, position):
+    img = Image.open(image_path)
+    iw, ih = img.size
 
-            page.merge_page(PdfReader(tmp.name).pages[0])
-        writer.add_page(page)
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    w,h = A4
+    x,y,angle = _draw_position(c,w,h,position)
 
-    with open(output_pdf,"wb") as f:
-        writer.write(f)
+    scale = 0.35
+    c.saveState()
+    c.translate(x,y)
+    c.rotate(angle)
+    c.setFillAlpha(0.2)
+    c.drawImage(image_path, -iw*scale/2, -ih*scale/2,
+                iw*scale, ih*scale, mask="auto")
+    c.restoreState()
+    c.save()
+    return buf.getvalue()
+
+def _apply_overlay(input_pdf, output_pdf, overlay, linearize, incremental):
+    """
+    Same overlay on every page. The overlay page is built once; with
+    incremental=True it is appended as one shared XObject instead of
+    rewriting the document (see tools/incremental.py).
+    """
+    if incremental and not linearize:
+        if overlay_pages_incremental(input_pdf, output_pdf, overlay, None):
+            return
 
-def add_image_watermark(input_pdf, output_pdf, image_path, position):
     reader = PdfReader(input_pdf)
     writer = PdfWriter()
-    img = Image.open(image_path)
-    iw, ih = img.size
-
+    overlay_page = PdfReader(io.BytesIO(overlay)).pages[0]
     for page in reader.pages:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            c = canvas.Canvas(tmp.name, pagesize=A4)
-            w,h = A4
-            x,y,angle = _draw_position(c,w,h,position)
+        page.merge_page(overlay_page)
+        writer.add_page(page)
 
-            scale = 0.35
-            c.saveState()
-            c.translate(x,y)
-            c.rotate(angle)
-            c.setFillAlpha(0.2)
-            c.drawImage(image_path, -iw*scale/2, -ih*scale/2,
-                        iw*scale, ih*scale, mask="auto")
-            c.restoreState()
-            c.save()
+    write_pdf(writer, output_pdf, linearize=linearize)
 
-            page.merge_page(PdfReader(tmp.name).pages[0])
-        writer.add_page(page)
+def add_text_watermark(input_pdf, output_pdf, text, position, linearize=False, incremental=False):
+    _apply_overlay(input_pdf, output_pdf, _text_overlay(text, position), linearize, incremental)
 
-    with open(output_pdf,"wb") as f:
-        writer.write(f)
+def add_image_watermark(input_pdf, output_pdf, image_path, position, linearize=False, incremental=False):
+    _apply_overlay(input_pdf, output_pdf, _image_overlay(image_path, position), linearize, incremental)
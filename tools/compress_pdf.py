@@ -0,0 +1,174 @@
+import os
+import math
+import shutil
+import tempfile
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import pikepdf
+from tools.pdf_output import write_pdf, optimize_file
+from tools.merge_pdf import dedupe_streams, copy_outline
+from tools.optimize_pdf import optimize_pdf
+from tools.tracing import run_subprocess, span
+
+# Ghostscript compression presets
+QUALITY_OPTIONS = {
+    "high": "/screen",       # max compression
+    "balanced": "/ebook",    # recommended
+    "low": "/prepress"       # best quality
+}
+LOSSLESS = "lossless"        # structural only, see optimize_pdf
+
+# ===== Parallel chunked Ghostscript (large inputs) =====
+# From this many pages the input is split into page ranges that separate
+# gs processes compress at the same time (at most COMPRESS_MAX_PROCESSES
+# per compress call), then the parts are put back together.
+COMPRESS_PARALLEL_MIN_PAGES = int(os.environ.get("COMPRESS_PARALLEL_MIN_PAGES", "200"))
+COMPRESS_MAX_PROCESSES = int(os.environ.get("COMPRESS_MAX_PROCESSES", str(min(4, os.cpu_count() or 1))))
+COMPRESS_MIN_CHUNK_PAGES = 50
+
+
+def _gs_command(input_path, output_path, quality):
+    return [
+        "gs", "-sDEVICE=pdfwrite",
+        "-dCompatibilityLevel=1.5",
+        f"-dPDFSETTINGS={quality}",
+        "-dNOPAUSE", "-dQUIET", "-dBATCH",
+        f"-sOutputFile={output_path}",
+        input_path
+    ]
+
+
+def _page_count(path):
+    try:
+        with pikepdf.open(path) as pdf:
+            return len(pdf.pages)
+    except Exception:
+        return None
+
+
+def _chunk_ranges(total, processes):
+    """[(start, end)] page ranges, at most `processes`, each ≥ COMPRESS_MIN_CHUNK_PAGES."""
+    n = max(1, min(processes, total // COMPRESS_MIN_CHUNK_PAGES))
+    size = math.ceil(total / n)
+    return [(start, min(start + size, total)) for start in range(0, total, size)]
+
+
+def _keep_document_level(src, merged):
+    """Bookmarks, page labels and document info of the original."""
+    try:
+        with src.open_outline() as src_outline:
+            if src_outline.root:
+                page_index = {p.obj.objgen: i for i, p in enumerate(src.pages)}
+                items = copy_outline(src_outline.root, src, page_index, 0)
+                with merged.open_outline() as merged_outline:
+                    merged_outline.root.extend(items)
+    except Exception:
+        pass
+
+    if "/PageLabels" in src.Root:
+        # copy_foreign only takes indirect objects (src is never saved)
+        merged.Root.PageLabels = merged.copy_foreign(src.make_indirect(src.Root.PageLabels))
+    for key, value in src.docinfo.items():
+        if isinstance(value, pikepdf.String):
+            merged.docinfo[key] = pikepdf.String(bytes(value))
+
+
+def _compress_chunked(input_path, output_path, quality, linearize):
+    """
+    Split into page ranges (pikepdf), gs each range in its own process,
+    reassemble. Every part embeds its own copy of shared resources
+    (fonts, logos, ICC profiles); identical ones are stored once again
+    via dedupe_streams.
+    """
+    workdir = tempfile.mkdtemp(prefix="compress_", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        with pikepdf.open(input_path) as src:
+            total = len(src.pages)
+            ranges = _chunk_ranges(total, COMPRESS_MAX_PROCESSES)
+
+            parts = []
+            with span("compress.split", parts=len(ranges), pages=total):
+                for n, (start, end) in enumerate(ranges):
+                    path = os.path.join(workdir, f"part{n}.pdf")
+                    with pikepdf.new() as part:
+                        part.pages.extend(src.pages[start:end])
+                        part.save(path)
+                    parts.append((path, os.path.join(workdir, f"part{n}_gs.pdf")))
+
+            # gs does the work in its own processes, threads only wait
+            with ThreadPoolExecutor(max_workers=len(parts)) as pool:
+                futures = [
+                    pool.submit(contextvars.copy_context().run, run_subprocess,
+                                _gs_command(part, out, quality), check=True)
+                    for part, out in parts
+                ]
+                for future in futures:
+                    future.result()
+
+            with span("compress.reassemble", parts=len(parts)) as s:
+                compressed = []
+                try:
+                    merged = pikepdf.new()
+                    for _, out in parts:
+                        compressed.append(pikepdf.open(out))
+                        merged.pages.extend(compressed[-1].pages)
+
+                    if len(merged.pages) != total:
+                        raise RuntimeError(f"Compressed parts have {len(merged.pages)} pages, expected {total}")
+
+                    _keep_document_level(src, merged)
+                    s.set(deduped_bytes=dedupe_streams(merged))
+                    write_pdf(merged, output_path, linearize=linearize)
+                finally:
+                    for pdf in compressed:
+                        pdf.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compress_pdf(input_path, output_path, level="balanced", linearize=False, report=False):
+    """
+    Ghostscript pdfwrite with the preset for `level`; if Ghostscript
+    fails, a lossless pikepdf rewrite (recompressed streams + object
+    streams) is used instead.
+
+    Inputs with COMPRESS_PARALLEL_MIN_PAGES pages or more are compressed
+    in page ranges by parallel gs processes. The result must have the
+    same page count as the input.
+
+    level="lossless" skips Ghostscript: structural optimization only,
+    returns its sizes (per step with report=True, see optimize_pdf).
+    """
+    if level == LOSSLESS:
+        try:
+            return optimize_pdf(input_path, output_path, linearize=linearize, report=report)
+        except Exception as e:
+            print("Lossless optimization failed:", e)
+            raise RuntimeError("Compression failed")
+
+    selected_quality = QUALITY_OPTIONS.get(level, "/ebook")
+    pages = _page_count(input_path)
+
+    try:
+        if pages and pages >= COMPRESS_PARALLEL_MIN_PAGES and COMPRESS_MAX_PROCESSES > 1:
+            _compress_chunked(input_path, output_path, selected_quality, linearize)
+        else:
+            run_subprocess(_gs_command(input_path, output_path, selected_quality), check=True)
+
+            if pages is not None and _page_count(output_path) != pages:
+                raise RuntimeError("Compressed output has a different page count")
+
+            if linearize:
+                optimize_file(output_path, linearize=True)
+
+    except Exception as e:
+        print("Ghostscript failed:", e)
+
+        # Fallback → pikepdf (lossless)
+        try:
+            with pikepdf.open(input_path) as pdf:
+                write_pdf(pdf, output_path, linearize=linearize,
+                          compress_streams=True, recompress_flate=True)
+        except Exception as e:
+            print("Fallback failed:", e)
+            raise RuntimeError("Compression failed")
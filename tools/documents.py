@@ -0,0 +1,191 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import threading
+import pikepdf
+import pypdfium2 as pdfium
+from werkzeug.utils import secure_filename
+
+DOCUMENT_FOLDER = os.environ.get("DOCUMENT_FOLDER", "/tmp/documents")
+DOCUMENT_TTL = int(os.environ.get("DOCUMENT_TTL", 3600))   # seconds since last use
+EVICT_INTERVAL = 60
+TEXT_PROBE_PAGES = 3
+DOC_ID = re.compile(r"[0-9a-f]{32}")     # uuid4().hex, as add() makes them
+
+
+def inspect_document(path):
+    """
+    Cheap metadata for a stored document: size, page count, page sizes,
+    encryption and whether the first pages already have a text layer.
+    Only the xref/page tree is read, no content is parsed or rendered.
+    """
+    meta = {
+        "size": os.path.getsize(path),
+        "is_pdf": False,
+        "page_count": None,
+        "page_sizes": [],
+        "encrypted": False,
+        "has_text": None,
+    }
+
+    with open(path, "rb") as f:
+        if b"%PDF" not in f.read(1024):
+            return meta
+    meta["is_pdf"] = True
+
+    try:
+        with pikepdf.open(path) as pdf:
+            meta["page_count"] = len(pdf.pages)
+            meta["encrypted"] = pdf.is_encrypted
+    except pikepdf.PasswordError:
+        meta["encrypted"] = True
+        return meta
+    except Exception:
+        return meta
+
+    try:
+        doc = pdfium.PdfDocument(path)
+        try:
+            sizes = []
+            for i in range(len(doc)):
+                w, h = doc.get_page_size(i)
+                size = [round(w), round(h)]
+                if size not in sizes:
+                    sizes.append(size)
+            meta["page_sizes"] = sizes
+
+            has_text = False
+            for i in range(min(TEXT_PROBE_PAGES, len(doc))):
+                page = doc[i]
+                textpage = page.get_textpage()
+                has_text = textpage.count_chars() > 0
+                textpage.close()
+                page.close()
+                if has_text:
+                    break
+            meta["has_text"] = has_text
+        finally:
+            doc.close()
+    except Exception:
+        pass
+
+    return meta
+
+
+class DocumentStore:
+    """
+    Upload-once document sessions on local disk.
+
+    <root>/<id>/meta.json + the file itself. A document expires `ttl`
+    seconds after it was last used; expired ones are evicted lazily.
+    """
+
+    def __init__(self, root=DOCUMENT_FOLDER, ttl=DOCUMENT_TTL):
+        self.root = root
+        self.ttl = ttl
+        self._last_evict = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def valid_id(doc_id):
+        return isinstance(doc_id, str) and DOC_ID.fullmatch(doc_id) is not None
+
+    def _dir(self, doc_id):
+        # Never derive a path from anything but a well-formed id
+        if not self.valid_id(doc_id):
+            raise ValueError(f"Invalid document id: {doc_id!r}")
+        return os.path.join(self.root, doc_id)
+
+    def _write_meta(self, doc_id, meta):
+        tmp = os.path.join(self._dir(doc_id), "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(self._dir(doc_id), "meta.json"))
+
+    def add(self, source, filename, move=False):
+        """
+        Store a document. source: path or FileStorage.
+        move=True moves a path into the store instead of copying it.
+        Returns the metadata dict (with "id").
+        """
+        self.evict_expired()
+
+        doc_id = uuid.uuid4().hex
+        filename = secure_filename(filename) or "document"
+        os.makedirs(self._dir(doc_id))
+        path = os.path.join(self._dir(doc_id), filename)
+
+        if isinstance(source, str):
+            if move:
+                shutil.move(source, path)
+            else:
+                shutil.copy(source, path)
+        else:
+            source.save(path)
+
+        now = time.time()
+        meta = {"id": doc_id, "filename": filename, "created": now,
+                "expires_at": now + self.ttl}
+        meta.update(inspect_document(path))
+        self._write_meta(doc_id, meta)
+        return meta
+
+    def get(self, doc_id, touch=True):
+        """Metadata for doc_id, or None when unknown/expired/malformed."""
+        if not self.valid_id(doc_id):
+            return None
+        self.evict_expired()
+        try:
+            with open(os.path.join(self._dir(doc_id), "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        now = time.time()
+        if meta["expires_at"] < now:
+            self.delete(doc_id)
+            return None
+
+        if touch:
+            meta["expires_at"] = now + self.ttl
+            self._write_meta(doc_id, meta)
+        return meta
+
+    def path(self, doc_id):
+        meta = self.get(doc_id, touch=False)
+        if not meta:
+            return None
+        return os.path.join(self._dir(doc_id), meta["filename"])
+
+    def delete(self, doc_id):
+        """False when there was no such document."""
+        if not self.valid_id(doc_id) or not os.path.isdir(self._dir(doc_id)):
+            return False
+        shutil.rmtree(self._dir(doc_id), ignore_errors=True)
+        return True
+
+    def evict_expired(self, force=False):
+        """Drop expired documents (at most once per EVICT_INTERVAL)."""
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_evict < EVICT_INTERVAL:
+                return
+            self._last_evict = now
+
+        for doc_id in os.listdir(self.root):
+            meta_path = os.path.join(self.root, doc_id, "meta.json")
+            try:
+                with open(meta_path) as f:
+                    expired = json.load(f)["expires_at"] < now
+            except (OSError, ValueError, KeyError):
+                # half-written or broken entry → only drop once it is old
+                try:
+                    expired = os.path.getmtime(os.path.join(self.root, doc_id)) < now - self.ttl
+                except OSError:
+                    expired = False
+            if expired:
+                shutil.rmtree(os.path.join(self.root, doc_id), ignore_errors=True)
@@ -1,15 +1,259 @@
-import subprocess
 import os
+import re
+import csv
 import shutil
+import zipfile
 import tempfile
+import datetime
+from openpyxl import load_workbook
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from tools.tracing import span, run_subprocess
 
-def excel_to_pdf(input_path, output_path):
+# ===== Native renderer settings =====
+FONT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "fronts", "DejaVuSans.ttf")
+FONT_NAME = "DejaVuSans"
+FONT_SIZE = 8
+ROW_HEIGHT = 12
+CELL_PAD = 3
+MARGIN = 28
+SAMPLE_ROWS = 200           # rows buffered to size the columns
+MAX_COL_WIDTH = 220
+MAX_NATIVE_COLUMNS = 30     # wider sheets look better through LibreOffice
+
+# Parts of an .xlsx we can't reproduce natively → LibreOffice
+UNSUPPORTED_PARTS = ("xl/charts/", "xl/drawings/", "xl/pivotTables/", "xl/embeddings/")
+
+# A sheet cell: <c r="A1" .../> or <c r="A1" ...>...</c>
+_CELL = re.compile(rb"<c\b[^>]*?(?:/>|>(.*?)</c>)", re.S)
+_CACHED_VALUE = re.compile(rb"<v>[^<]")
+
+pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+_FONT_CMAP = pdfmetrics.getFont(FONT_NAME).face.charToGlyph
+
+
+class _NeedsLibreOffice(Exception):
+    pass
+
+
+def _uncached_formula(xml):
+    """True if a cell in this piece of sheet XML has a formula but no cached value."""
+    for m in _CELL.finditer(xml):
+        content = m.group(1)
+        if content and b"<f" in content and not _CACHED_VALUE.search(content):
+            return True
+    return False
+
+
+def _native_supported(input_path):
+    """
+    True for CSV and for .xlsx files without charts, drawings/images,
+    pivot tables, embedded objects, merged-cell layouts or formulas
+    without a cached result (files written by openpyxl / pandas never
+    computed them; openpyxl would read them as empty, LibreOffice
+    calculates them). Only the zip directory and raw sheet XML are scanned.
+    """
+    ext = os.path.splitext(input_path)[1].lower()
+    if ext == ".csv":
+        return True
+    if ext not in (".xlsx", ".xlsm"):
+        return False
+
+    try:
+        with zipfile.ZipFile(input_path) as zf:
+            names = zf.namelist()
+            if any(n.startswith(UNSUPPORTED_PARTS) for n in names):
+                return False
+
+            for name in names:
+                if not re.match(r"xl/worksheets/sheet\d+\.xml$", name):
+                    continue
+                tail = b""
+                with zf.open(name) as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        data = tail + chunk
+                        if b"<mergeCell " in data:
+                            return False
+                        # whole cells only; the rest waits for the next chunk
+                        cut = data.rfind(b"</c>") + len(b"</c>") if b"</c>" in data else 0
+                        if _uncached_formula(data[:cut]):
+                            return False
+                        tail = data[cut:] if len(data) - cut < 1024 * 1024 else data[-16:]
+    except zipfile.BadZipFile:
+        return False
+
+    return True
+
+
+def _csv_rows(reader, title):
+    """csv rows, checked against MAX_NATIVE_COLUMNS as they come (no header to ask)."""
+    for row in reader:
+        if len(row) > MAX_NATIVE_COLUMNS and any(row[MAX_NATIVE_COLUMNS:]):
+            raise _NeedsLibreOffice(f"{title}: too many columns")
+        yield row
+
+
+def _iter_sheets(input_path):
+    """Yield (sheet_title, row_iterator) with bounded memory."""
+    if input_path.lower().endswith(".csv"):
+        title = os.path.splitext(os.path.basename(input_path))[0]
+        with open(input_path, newline="", encoding="utf-8-sig", errors="replace") as f:
+            yield title, _csv_rows(csv.reader(f), title)
+        return
+
+    wb = load_workbook(input_path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            if (ws.max_column or 0) > MAX_NATIVE_COLUMNS:
+                raise _NeedsLibreOffice(f"{ws.title}: too many columns")
+            yield ws.title, ws.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _fmt(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M") if value.time() != datetime.time() else value.strftime("%Y-%m-%d")
+    if isinstance(value, datetime.date):
+        return value.strftime("%Y-%m-%d")
+    return str(value).replace("\n", " ")
+
+
+def _fit(text, width):
+    """Trim text so it fits in width points."""
+    if pdfmetrics.stringWidth(text, FONT_NAME, FONT_SIZE) <= width:
+        return text
+    while text and pdfmetrics.stringWidth(text + "…", FONT_NAME, FONT_SIZE) > width:
+        text = text[:max(len(text) - max(len(text) // 8, 1), 0)]
+    return text + "…" if text else ""
+
+
+class _TableWriter:
+    """Streams rows onto reportlab pages, repeating the header row."""
+
+    def __init__(self, c):
+        self.c = c
+
+    def start_sheet(self, title, sample):
+        ncols = max((len(r) for r in sample), default=0)
+        widths = [0.0] * ncols
+        for row in sample:
+            for i, v in enumerate(row):
+                w = pdfmetrics.stringWidth(_fmt(v), FONT_NAME, FONT_SIZE) + 2 * CELL_PAD
+                widths[i] = min(max(widths[i], w), MAX_COL_WIDTH)
+        widths = [max(w, 20) for w in widths]
+
+        # Portrait if it fits, else landscape, else shrink columns
+        pagesize = A4
+        if sum(widths) > A4[0] - 2 * MARGIN:
+            pagesize = landscape(A4)
+        avail = pagesize[0] - 2 * MARGIN
+        if sum(widths) > avail:
+            ratio = avail / sum(widths)
+            widths = [w * ratio for w in widths]
+
+        self.pagesize = pagesize
+        self.widths = widths
+        self.title = title
+        self.header = [_fmt(v) for v in sample[0]] if sample else []
+        self._new_page()
+
+    def _new_page(self):
+        c = self.c
+        c.setPageSize(self.pagesize)
+        self.y = self.pagesize[1] - MARGIN
+
+        c.setFont(FONT_NAME, FONT_SIZE + 2)
+        c.drawString(MARGIN, self.y - FONT_SIZE - 2, self.title)
+        self.y -= ROW_HEIGHT + 8
+
+    def _draw_row(self, cells, shade=False):
+        c = self.c
+        top = self.y
+        bottom = top - ROW_HEIGHT
+        x = MARGIN
+
+        if shade:
+            c.setFillGray(0.9)
+            c.rect(MARGIN, bottom, sum(self.widths), ROW_HEIGHT, stroke=0, fill=1)
+            c.setFillGray(0)
+
+        c.setFont(FONT_NAME, FONT_SIZE)
+        c.setStrokeGray(0.75)
+        c.setLineWidth(0.3)
+        for i, w in enumerate(self.widths):
+            text = cells[i] if i < len(cells) else ""
+            if text and not text.isascii() and any(ord(ch) not in _FONT_CMAP for ch in text):
+                # e.g. Gujarati script: DejaVu has no glyphs, LibreOffice does
+                raise _NeedsLibreOffice("glyphs missing from bundled font")
+            if text:
+                c.drawString(x + CELL_PAD, bottom + 3.5, _fit(text, w - 2 * CELL_PAD))
+            c.rect(x, bottom, w, ROW_HEIGHT, stroke=1, fill=0)
+            x += w
+
+        self.y = bottom
+
+    def add_row(self, values, is_header=False):
+        if self.y - ROW_HEIGHT < MARGIN:
+            self.c.showPage()
+            self._new_page()
+            if self.header and not is_header:
+                self._draw_row(self.header, shade=True)
+
+        self._draw_row([_fmt(v) for v in values], shade=is_header)
+
+    def end_sheet(self):
+        self.c.showPage()
+
+
+def _native_excel_to_pdf(input_path, output_path):
     """
-    Converts Excel → PDF using LibreOffice (Best Quality)
-    Works for Gujarati, Hindi, Marathi, all Indic languages.
-    Zero crashes on Render.
+    Render CSV/XLSX sheets as paginated grid tables with reportlab.
+    Rows stream from openpyxl read-only mode / csv, only SAMPLE_ROWS are
+    buffered per sheet (to size the columns).
     """
+    tmp_output = output_path + ".part"
+    c = canvas.Canvas(tmp_output, pagesize=A4, pageCompression=1)
+    writer = _TableWriter(c)
+    pages = 0
+
+    try:
+        for title, rows in _iter_sheets(input_path):
+            sample = []
+            for row in rows:
+                if any(v not in (None, "") for v in row):
+                    sample.append(row)
+                if len(sample) >= SAMPLE_ROWS:
+                    break
+            if not sample:
+                continue
+
+            writer.start_sheet(title, sample)
+            for i, row in enumerate(sample):
+                writer.add_row(row, is_header=(i == 0))
+            for row in rows:
+                if any(v not in (None, "") for v in row):
+                    writer.add_row(row)
+            writer.end_sheet()
+            pages += 1
+
+        if not pages:
+            c.showPage()   # empty workbook → one blank page
+        c.save()
+        os.replace(tmp_output, output_path)
+
+    finally:
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
 
+
+def _libreoffice_to_pdf(input_path, output_path):
     temp_dir = tempfile.mkdtemp(dir="/tmp")
 
     try:
@@ -28,16 +272,41 @@ def excel_to_pdf(input_path, output_path):
             local_input
         ]
 
-        subprocess.run(cmd, check=True)
+        run_subprocess(cmd, check=True)
 
         # Find generated PDF
-        generated_pdf = local_input.replace(".xlsx", ".pdf").replace(".xls", ".pdf")
+        generated_pdf = os.path.splitext(local_input)[0] + ".pdf"
 
         # Move to final output
         shutil.move(generated_pdf, output_path)
 
-    except Exception as e:
-        raise RuntimeError(f"Excel to PDF conversion failed: {str(e)}")
-
     finally:
         shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def excel_to_pdf(input_path, output_path):
+    """
+    Converts Excel → PDF.
+
+    Simple sheets (CSV, or XLSX without charts, images, pivots or merged
+    cells) are rendered natively with openpyxl + reportlab using the
+    bundled DejaVu font, no LibreOffice startup. Text the font has no
+    glyphs for switches to LibreOffice. Everything else goes
+    through LibreOffice (Best Quality), which works for Gujarati, Hindi,
+    Marathi, all Indic languages.
+    """
+
+    try:
+        if _native_supported(input_path):
+            try:
+                with span("excel_to_pdf.native"):
+                    _native_excel_to_pdf(input_path, output_path)
+                return output_path
+            except _NeedsLibreOffice:
+                pass
+
+        _libreoffice_to_pdf(input_path, output_path)
+        return output_path
+
+    except Exception as e:
+        raise RuntimeError(f"Excel to PDF conversion failed: {str(e)}")
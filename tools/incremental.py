@@ -0,0 +1,244 @@
+"""
+Incremental-update saves.
+
+Instead of re-serializing a whole document, the original bytes are kept
+as they are and only changed / new objects are appended, followed by a
+new xref section whose /Prev points at the original one (PDF 1.7
+section 7.5.6). Output cost scales with the size of the change, and the
+original revision stays byte-identical, which is also what digital
+signatures need.
+"""
+import io
+import re
+import zlib
+import shutil
+import pikepdf
+
+OVERLAY_NAME = "SrjOverlay"
+TAIL_BYTES = 4096
+
+
+def _startxref(path):
+    """Offset of the last xref section, from the file tail."""
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        size = f.tell()
+        f.seek(max(0, size - TAIL_BYTES))
+        tail = f.read()
+    found = re.findall(rb"startxref\s+(\d+)", tail)
+    if not found:
+        return None
+    return int(found[-1])
+
+
+def _uses_xref_stream(path, offset):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        head = f.read(32).lstrip()
+    return not head.startswith(b"xref")
+
+
+def can_update_incrementally(pdf, path):
+    """
+    Incremental updates need an intact xref chain to point /Prev at and
+    no encryption (appended strings/streams would have to be encrypted).
+    """
+    if pdf.is_encrypted or pdf.get_warnings():
+        return False
+    return _startxref(path) is not None
+
+
+def _collect_new(obj, existing, found, seen):
+    """
+    Indirect objects reachable from obj that were created in this session
+    (not in `existing`, the objgens the file had before). qpdf numbers new
+    objects from the highest object number + 1, which can be below the
+    trailer's /Size when the xref ends in free entries, so /Size can't
+    tell old from new.
+    """
+    if isinstance(obj, pikepdf.Stream):
+        children = [v for _, v in obj.stream_dict.items()]
+    elif isinstance(obj, pikepdf.Dictionary):
+        children = [v for _, v in obj.items()]
+    elif isinstance(obj, pikepdf.Array):
+        children = list(obj)
+    else:
+        return
+
+    for child in children:
+        if not isinstance(child, pikepdf.Object):
+            continue
+        if child.is_indirect:
+            if child.objgen in existing or child.objgen in seen:
+                continue
+            seen.add(child.objgen)
+            found.append(child)
+        _collect_new(child, existing, found, seen)
+
+
+def _serialize(obj):
+    num, gen = obj.objgen
+    if isinstance(obj, pikepdf.Stream):
+        raw = obj.read_raw_bytes()
+        obj.stream_dict["/Length"] = len(raw)
+        return (f"{num} {gen} obj\n".encode() + obj.stream_dict.unparse(resolved=True)
+                + b"\nstream\n" + raw + b"\nendstream\nendobj\n")
+    return f"{num} {gen} obj\n".encode() + obj.unparse(resolved=True) + b"\nendobj\n"
+
+
+def _runs(numbers):
+    """[1, 2, 3, 7, 8] → [(1, 3), (7, 2)] (start, count)."""
+    runs = []
+    for n in sorted(numbers):
+        if runs and runs[-1][0] + runs[-1][1] == n:
+            runs[-1][1] += 1
+        else:
+            runs.append([n, 1])
+    return runs
+
+
+def _trailer_entries(pdf, size, prev):
+    entries = [f"/Size {size}", f"/Prev {prev}", "/Root {} {} R".format(*pdf.Root.objgen)]
+    info = pdf.trailer.get("/Info")
+    if isinstance(info, pikepdf.Object) and info.is_indirect:
+        entries.append("/Info {} {} R".format(*info.objgen))
+    if "/ID" in pdf.trailer:
+        entries.append("/ID " + pdf.trailer.ID.unparse(resolved=True).decode("latin-1"))
+    return entries
+
+
+def append_update(pdf, original_path, output_path, objects):
+    """
+    Write output_path = original bytes + `objects` (indirect pikepdf
+    objects of pdf, changed or new) + a new xref section and trailer.
+    The xref section uses the same form (table / stream) as the original.
+    Returns the number of appended bytes.
+    """
+    prev = _startxref(original_path)
+    xref_stream = _uses_xref_stream(original_path, prev)
+    size = int(pdf.trailer.Size)
+
+    shutil.copyfile(original_path, output_path)
+
+    with open(output_path, "r+b") as f:
+        f.seek(0, 2)
+        start = f.tell()
+        f.seek(-1, 2)
+        if f.read(1) not in (b"\n", b"\r"):
+            f.write(b"\n")
+
+        offsets = {}
+        for obj in sorted(objects, key=lambda o: o.objgen):
+            offsets[obj.objgen] = f.tell()
+            f.write(_serialize(obj))
+            size = max(size, obj.objgen[0] + 1)
+
+        xref_offset = f.tell()
+        if xref_stream:
+            # The xref stream is an object itself and lists its own offset
+            xref_num = size
+            size += 1
+            offsets[(xref_num, 0)] = xref_offset
+
+            width = max(4, (xref_offset.bit_length() + 7) // 8)
+            rows = b"".join(
+                b"\x01" + offsets[key].to_bytes(width, "big") + key[1].to_bytes(2, "big")
+                for key in sorted(offsets)
+            )
+            data = zlib.compress(rows)
+            index = " ".join(f"{s} {n}" for s, n in _runs(k[0] for k in offsets))
+            entries = _trailer_entries(pdf, size, prev) + [
+                "/Type /XRef", f"/W [ 1 {width} 2 ]", f"/Index [ {index} ]",
+                "/Filter /FlateDecode", f"/Length {len(data)}",
+            ]
+            f.write(f"{xref_num} 0 obj\n<< {' '.join(entries)} >>\nstream\n".encode("latin-1"))
+            f.write(data + b"\nendstream\nendobj\n")
+        else:
+            by_num = {num: (off, gen) for (num, gen), off in offsets.items()}
+            f.write(b"xref\n")
+            for first, count in _runs(by_num):
+                f.write(f"{first} {count}\n".encode())
+                for num in range(first, first + count):
+                    off, gen = by_num[num]
+                    f.write(f"{off:010d} {gen:05d} n \n".encode())
+            f.write(f"trailer\n<< {' '.join(_trailer_entries(pdf, size, prev))} >>\n".encode("latin-1"))
+
+        f.write(f"startxref\n{xref_offset}\n%%EOF\n".encode())
+        return f.tell() - start
+
+
+def _inherited_resources(page_obj):
+    node = page_obj
+    while node is not None:
+        if "/Resources" in node:
+            return node.Resources
+        node = node.get("/Parent")
+    return pikepdf.Dictionary()
+
+
+def overlay_pages_incremental(input_path, output_path, overlay_pdf, page_indexes):
+    """
+    Draw page 1 of overlay_pdf (bytes or path) on top of the given
+    0-based pages (None = all) as an incremental update of input_path.
+
+    The overlay is added once as a shared form XObject; each target page
+    gets a new /Contents array (q, original content, Q + overlay) and its
+    own copy of the resource dictionary. Everything else is untouched.
+    Returns False (and writes nothing) when the file can't be updated
+    incrementally, so the caller can fall back to a full rewrite.
+    """
+    if isinstance(overlay_pdf, (bytes, bytearray)):
+        overlay_pdf = io.BytesIO(overlay_pdf)
+
+    with pikepdf.open(input_path) as pdf, pikepdf.open(overlay_pdf) as overlay:
+        if page_indexes is None:
+            pages = list(pdf.pages)
+        else:
+            pages = [pdf.pages[i] for i in sorted(set(page_indexes)) if 0 <= i < len(pdf.pages)]
+        if not pages or not can_update_incrementally(pdf, input_path):
+            return False
+
+        existing = {obj.objgen for obj in pdf.objects}
+
+        # One shared form XObject + two shared tiny content streams
+        form = pdf.copy_foreign(overlay.pages[0].as_form_xobject())
+
+        used = set()
+        for page in pages:
+            xobjects = _inherited_resources(page.obj).get("/XObject")
+            if isinstance(xobjects, pikepdf.Dictionary):
+                used.update(xobjects.keys())
+        name, n = "/" + OVERLAY_NAME, 0
+        while name in used:
+            n += 1
+            name = f"/{OVERLAY_NAME}{n}"
+
+        push = pdf.make_indirect(pdf.make_stream(b"q\n"))
+        draw = pdf.make_indirect(pdf.make_stream(f"\nQ\nq {name} Do Q\n".encode()))
+
+        for page in pages:
+            contents = page.obj.get("/Contents")
+            if isinstance(contents, pikepdf.Array):
+                contents = list(contents)
+            elif contents is not None:
+                contents = [contents]
+            else:
+                contents = []
+            page.obj.Contents = pikepdf.Array([push] + contents + [draw])
+
+            resources = pikepdf.Dictionary(dict(_inherited_resources(page.obj).items()))
+            xobjects = resources.get("/XObject")
+            xobjects = pikepdf.Dictionary(dict(xobjects.items())) \
+                if isinstance(xobjects, pikepdf.Dictionary) else pikepdf.Dictionary()
+            xobjects[name] = form
+            resources.XObject = xobjects
+            page.obj.Resources = resources
+
+        objects = [page.obj for page in pages]
+        new = [form, push, draw]
+        seen = {o.objgen for o in new}
+        for obj in list(new):
+            _collect_new(obj, existing, new, seen)
+
+        append_update(pdf, input_path, output_path, objects + new)
+        return True
@@ -0,0 +1,451 @@
+"""
+Job broker: HTTP front-ends hand tool calls to worker processes that can
+run on any node.
+
+    JOB_BROKER=sqlite:////shared/jobs.db   → SQLite file on a shared volume
+    JOB_BROKER=redis://redis:6379/0        → Redis / any Redis-compatible server
+                                             (needs the `redis` package)
+
+Front-end: with JOB_BROKER set, app.run_tool() submits the call and
+waits for its result. Workers:
+
+    python -m tools.jobs --broker sqlite:////shared/jobs.db --concurrency 2
+    python -m tools.jobs --tools run_ocr,compress_pdf     # only these tools
+
+Jobs carry file paths, not file contents, so UPLOAD_FOLDER,
+OUTPUT_FOLDER (and DOCUMENT_FOLDER / THUMB_CACHE) must be on storage all
+nodes see at the same path.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import argparse
+import importlib
+import threading
+import multiprocessing
+from tools.tracing import start_span, activate, deactivate
+
+JOB_BROKER = os.environ.get("JOB_BROKER", "")
+JOB_TIMEOUT = int(os.environ.get("JOB_TIMEOUT", 600))     # front-end wait, seconds
+JOB_LEASE = int(os.environ.get("JOB_LEASE", 60))          # no heartbeat this long → requeue
+JOB_MAX_ATTEMPTS = 3
+# Tools sent to the broker (comma separated, default: every registered tool)
+JOB_TOOLS = [t.strip() for t in os.environ.get("JOB_TOOLS", "").split(",") if t.strip()]
+
+POLL_MIN = 0.05
+POLL_MAX = 1.0
+
+# Tool name → module. Workers only run functions listed here.
+TOOLS = {
+    "word_to_pdf": "tools.word_to_pdf",
+    "pdf_to_word": "tools.pdf_to_word",
+    "merge_pdf": "tools.merge_pdf",
+    "split_selected_pages": "tools.split_pdf",
+    "split_pdf_to_zip": "tools.split_pdf",
+    "remove_pages": "tools.remove_pages",
+    "organize_pdf": "tools.organize_pdf",
+    "compress_pdf": "tools.compress_pdf",
+    "repair_pdf": "tools.repair_pdf",
+    "run_ocr": "tools.ocr_pdf",
+    "excel_to_pdf": "tools.excel_to_pdf",
+    "pdf_to_excel": "tools.pdf_to_excel",
+    "pdf_to_image": "tools.pdf_to_image",
+    "render_thumbnails": "tools.thumbnails",
+    "rotate_pdf": "tools.rotate_pdf",
+    "add_text_watermark": "tools.add_watermark",
+    "add_image_watermark": "tools.add_watermark",
+    "protect_pdf": "tools.protect_pdf",
+    "unlock_pdf": "tools.unlock_pdf",
+    "sign_pdf": "tools.sign_pdf",
+}
+
+
+def resolve_tool(name):
+    module = TOOLS.get(name)
+    if module is None:
+        raise RuntimeError(f"Unknown tool: {name}")
+    return getattr(importlib.import_module(module), name)
+
+
+def offload_name(fn, args, kwargs):
+    """
+    Registry name when this call can go through the broker: a registered
+    tool (allowed by JOB_TOOLS) with JSON-serializable arguments
+    (e.g. merge with in-memory uploads runs locally). Else None.
+    """
+    name = fn.__name__
+    if TOOLS.get(name) != fn.__module__:
+        return None
+    if JOB_TOOLS and name not in JOB_TOOLS:
+        return None
+    try:
+        json.dumps([args, kwargs])
+    except (TypeError, ValueError):
+        return None
+    return name
+
+
+class Broker:
+    """submit / claim / heartbeat / complete / fail / wait, see backends."""
+
+    def call(self, tool, args, kwargs, trace=None, timeout=JOB_TIMEOUT):
+        """Submit and block until a worker finished the job."""
+        payload = {"args": list(args), "kwargs": kwargs}
+        if trace is not None:
+            payload["trace"] = {"trace_id": trace.trace_id, "parent_id": trace.span_id}
+        job_id = self.submit(tool, payload)
+        return self.wait(job_id, timeout)
+
+
+# ===== SQLite backend =====
+class SQLiteBroker(Broker):
+    """
+    One table in a SQLite file. Claims happen inside BEGIN IMMEDIATE, so
+    any number of front-end and worker processes can share the file.
+    Rollback journal (not WAL) so it also works on network volumes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db().execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                tool TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                result TEXT,
+                error TEXT,
+                worker TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL,
+                heartbeat REAL
+            )
+        """)
+        self._db().execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.db = db
+        return db
+
+    def submit(self, tool, payload):
+        job_id = uuid.uuid4().hex
+        self._db().execute(
+            "INSERT INTO jobs (id, tool, payload, created) VALUES (?, ?, ?, ?)",
+            (job_id, tool, json.dumps(payload), time.time())
+        )
+        return job_id
+
+    def claim(self, worker, tools=None):
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Jobs of workers that died: retry, or give up after a few tries
+            db.execute(
+                "UPDATE jobs SET status = 'failed', error = 'worker lost' "
+                "WHERE status = 'running' AND heartbeat < ? AND attempts >= ?",
+                (now - JOB_LEASE, JOB_MAX_ATTEMPTS)
+            )
+            db.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL "
+                "WHERE status = 'running' AND heartbeat < ?",
+                (now - JOB_LEASE,)
+            )
+
+            query = "SELECT id, tool, payload FROM jobs WHERE status = 'queued'"
+            params = []
+            if tools:
+                query += f" AND tool IN ({','.join('?' * len(tools))})"
+                params.extend(tools)
+            row = db.execute(query + " ORDER BY created LIMIT 1", params).fetchone()
+
+            if row:
+                db.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, heartbeat = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (worker, now, row[0])
+                )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+        if not row:
+            return None
+        return {"id": row[0], "tool": row[1], **json.loads(row[2])}
+
+    def heartbeat(self, job_id):
+        self._db().execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time(), job_id))
+
+    def complete(self, job_id, result):
+        self._db().execute(
+            "UPDATE jobs SET status = 'done', result = ? WHERE id = ?",
+            (json.dumps(result), job_id)
+        )
+
+    def fail(self, job_id, error):
+        self._db().execute(
+            "UPDATE jobs SET status = 'failed', error = ? WHERE id = ?", (error, job_id)
+        )
+
+    def wait(self, job_id, timeout=JOB_TIMEOUT):
+        db = self._db()
+        deadline = time.time() + timeout
+        delay = POLL_MIN
+        while True:
+            row = db.execute("SELECT status, result, error FROM jobs WHERE id = ?",
+                             (job_id,)).fetchone()
+            if row is None:
+                raise RuntimeError("Job disappeared")
+            status, result, error = row
+            if status in ("done", "failed"):
+                db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                if status == "failed":
+                    raise RuntimeError(error or "Job failed")
+                return json.loads(result)
+
+            if time.time() > deadline:
+                # Nobody should start it after we gave up
+                db.execute("DELETE FROM jobs WHERE id = ? AND status = 'queued'", (job_id,))
+                raise RuntimeError("Job timed out")
+
+            time.sleep(delay)
+            delay = min(delay * 2, POLL_MAX)
+
+
+# ===== Redis backend =====
+class RedisBroker(Broker):
+    """
+    Per-tool queue lists (jobs:queue:<tool>), a job hash per job, a
+    sorted set of running jobs by heartbeat and a result list per job
+    that the front-end BLPOPs.
+
+    Claiming (queue → running) and recovering lost jobs (running → queue
+    or failed) are Lua scripts, so a worker dying halfway can't drop a
+    job between the two structures. Scripts don't block; run_worker
+    polls with backoff.
+    """
+
+    RESULT_TTL = 3600
+
+    # KEYS: jobs:running, queue lists in order; ARGV: now, worker
+    CLAIM_SCRIPT = """
+    for i = 2, #KEYS do
+        local job_id = redis.call('RPOP', KEYS[i])
+        if job_id then
+            local job = 'jobs:' .. job_id
+            local tool = redis.call('HGET', job, 'tool')
+            if not tool then
+                return {job_id}   -- cancelled while queued
+            end
+            redis.call('ZADD', KEYS[1], ARGV[1], job_id)
+            redis.call('HINCRBY', job, 'attempts', 1)
+            redis.call('HSET', job, 'worker', ARGV[2])
+            return {job_id, tool, redis.call('HGET', job, 'payload')}
+        end
+    end
+    return false
+    """
+
+    # KEYS: jobs:running; ARGV: lease cutoff, max attempts, result ttl
+    REQUEUE_SCRIPT = """
+    local lost = redis.call('ZRANGEBYSCORE', KEYS[1], 0, ARGV[1])
+    for _, job_id in ipairs(lost) do
+        redis.call('ZREM', KEYS[1], job_id)
+        local job = 'jobs:' .. job_id
+        local tool = redis.call('HGET', job, 'tool')
+        if tool then
+            if (tonumber(redis.call('HGET', job, 'attempts')) or 0) >= tonumber(ARGV[2]) then
+                local result = 'jobs:result:' .. job_id
+                redis.call('DEL', job)
+                redis.call('LPUSH', result, cjson.encode({error = 'worker lost'}))
+                redis.call('EXPIRE', result, ARGV[3])
+            else
+                redis.call('RPUSH', 'jobs:queue:' .. tool, job_id)
+            end
+        end
+    end
+    return #lost
+    """
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("JOB_BROKER=redis:// needs the redis package (pip install redis)")
+        self.r = redis.Redis.from_url(url)
+        self._claim = self.r.register_script(self.CLAIM_SCRIPT)
+        self._requeue = self.r.register_script(self.REQUEUE_SCRIPT)
+
+    def submit(self, tool, payload):
+        job_id = uuid.uuid4().hex
+        pipe = self.r.pipeline()
+        pipe.hset(f"jobs:{job_id}", mapping={"tool": tool, "payload": json.dumps(payload), "attempts": 0})
+        pipe.lpush(f"jobs:queue:{tool}", job_id)
+        pipe.execute()
+        return job_id
+
+    def _requeue_lost(self):
+        self._requeue(keys=["jobs:running"],
+                      args=[time.time() - JOB_LEASE, JOB_MAX_ATTEMPTS, self.RESULT_TTL])
+
+    def claim(self, worker, tools=None):
+        self._requeue_lost()
+        keys = ["jobs:running"] + [f"jobs:queue:{t}" for t in (tools or TOOLS)]
+        found = self._claim(keys=keys, args=[time.time(), worker])
+        if not found or len(found) < 3:
+            return None   # nothing queued, or cancelled
+        job_id, tool, payload = (v.decode() for v in found)
+        return {"id": job_id, "tool": tool, **json.loads(payload)}
+
+    def heartbeat(self, job_id):
+        self.r.zadd("jobs:running", {job_id: time.time()}, xx=True)
+
+    def _finish(self, job_id, record):
+        pipe = self.r.pipeline()
+        pipe.zrem("jobs:running", job_id)
+        pipe.delete(f"jobs:{job_id}")
+        pipe.lpush(f"jobs:result:{job_id}", json.dumps(record))
+        pipe.expire(f"jobs:result:{job_id}", self.RESULT_TTL)
+        pipe.execute()
+
+    def complete(self, job_id, result):
+        self._finish(job_id, {"result": result})
+
+    def fail(self, job_id, error):
+        self._finish(job_id, {"error": error})
+
+    def wait(self, job_id, timeout=JOB_TIMEOUT):
+        popped = self.r.blpop(f"jobs:result:{job_id}", timeout=max(1, int(timeout)))
+        if not popped:
+            tool = self.r.hget(f"jobs:{job_id}", "tool")
+            if tool is not None:
+                self.r.lrem(f"jobs:queue:{tool.decode()}", 0, job_id)
+            self.r.delete(f"jobs:{job_id}")
+            raise RuntimeError("Job timed out")
+
+        record = json.loads(popped[1])
+        if "error" in record:
+            raise RuntimeError(record["error"] or "Job failed")
+        return record["result"]
+
+
+def get_broker(url=JOB_BROKER):
+    """Broker for a JOB_BROKER url, or None when work runs in-process."""
+    if not url:
+        return None
+    if url.startswith("sqlite:///"):
+        return SQLiteBroker(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBroker(url)
+    raise RuntimeError(f"Unsupported JOB_BROKER: {url}")
+
+
+# ===== Worker =====
+def execute(job, worker):
+    """Run one claimed job inside a "job.<tool>" span joined to the request trace."""
+    fn = resolve_tool(job["tool"])
+    trace = job.get("trace") or {}
+
+    s = start_span(f"job.{job['tool']}", trace_id=trace.get("trace_id"), worker=worker)
+    if trace.get("parent_id"):
+        s.parent_id = trace["parent_id"]
+    token = activate(s)
+    try:
+        result = fn(*job.get("args", []), **job.get("kwargs", {}))
+    except BaseException as e:
+        s.finish(error=e)
+        raise
+    finally:
+        deactivate(token)
+    s.finish()
+    return result
+
+
+def run_worker(broker_url=JOB_BROKER, tools=None, max_jobs=None):
+    """Pull and run jobs one at a time until max_jobs (None = forever)."""
+    broker = get_broker(broker_url)
+    if broker is None:
+        raise RuntimeError("No broker configured (JOB_BROKER or --broker)")
+
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    current = {"id": None}
+    stop = threading.Event()
+
+    def beat():
+        hb = get_broker(broker_url)   # own connection for this thread
+        while not stop.wait(JOB_LEASE / 3):
+            if current["id"]:
+                try:
+                    hb.heartbeat(current["id"])
+                except Exception as e:
+                    print("HEARTBEAT ERROR:", e, file=sys.stderr)
+
+    threading.Thread(target=beat, daemon=True).start()
+
+    done = 0
+    delay = POLL_MIN
+    try:
+        while max_jobs is None or done < max_jobs:
+            job = broker.claim(worker, tools)
+            if job is None:
+                time.sleep(delay)
+                delay = min(delay * 2, POLL_MAX)
+                continue
+            delay = POLL_MIN
+
+            current["id"] = job["id"]
+            try:
+                result = execute(job, worker)
+                broker.complete(job["id"], result)
+            except Exception as e:
+                print(f"JOB {job['tool']} FAILED:", e, file=sys.stderr)
+                broker.fail(job["id"], str(e))
+            finally:
+                current["id"] = None
+            done += 1
+    finally:
+        stop.set()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run tool jobs from the shared broker")
+    ap.add_argument("--broker", default=JOB_BROKER, help="sqlite:///path or redis://host:port/db (default: $JOB_BROKER)")
+    ap.add_argument("--concurrency", type=int, default=1, help="worker processes (default 1)")
+    ap.add_argument("--tools", help="comma separated tool names to serve (default: all)")
+    args = ap.parse_args()
+
+    tools = [t.strip() for t in args.tools.split(",")] if args.tools else None
+    for name in tools or []:
+        if name not in TOOLS:
+            ap.error(f"unknown tool {name}; known: {', '.join(TOOLS)}")
+
+    print(f"Worker: {args.concurrency} process(es) on {args.broker}, tools: {', '.join(tools or TOOLS)}")
+    if args.concurrency <= 1:
+        run_worker(args.broker, tools)
+        return
+
+    # One job per process: pdfium / tesseract are not thread-safe
+    procs = [multiprocessing.Process(target=run_worker, args=(args.broker, tools), daemon=True)
+             for _ in range(args.concurrency)]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,186 @@
 import os
-import tempfile
-from PyPDF2 import PdfMerger
+import hashlib
+import logging
+import pikepdf
+from tools.pdf_output import write_pdf
 
-def merge_pdf(input_files, output_path):
+log = logging.getLogger(__name__)
+
+
+def _open_source(src):
+    """
+    Open one merge input with pikepdf without copying it to disk first.
+    Accepts a path or an uploaded FileStorage (its spooled stream is used).
+    """
+    if isinstance(src, (str, os.PathLike)):
+        return pikepdf.open(src)
+
+    stream = getattr(src, "stream", src)
+    stream.seek(0)
+    return pikepdf.open(stream)
+
+
+def _unparse(value):
+    """Stable bytes for a dictionary value (indirect objects by reference)."""
+    if not isinstance(value, pikepdf.Object):
+        return repr(value).encode()
+    if value.is_indirect:
+        return "{} {} R".format(*value.objgen).encode()
+    return value.unparse()
+
+
+def _stream_key(stream):
+    """Hash of raw (still encoded) data + stream dictionary minus /Length."""
+    h = hashlib.sha256(stream.read_raw_bytes())
+    for key in sorted(stream.stream_dict.keys()):
+        if key == "/Length":
+            continue
+        h.update(key.encode())
+        h.update(_unparse(stream.stream_dict[key]))
+    return h.digest()
+
+
+def _rewrite_refs(obj, replace):
+    """Swap indirect references found in obj (and its direct children)."""
+    if isinstance(obj, pikepdf.Stream):
+        obj = obj.stream_dict
+
+    if isinstance(obj, pikepdf.Dictionary):
+        items = [(k, obj[k]) for k in list(obj.keys())]
+    elif isinstance(obj, pikepdf.Array):
+        items = list(enumerate(obj))
+    else:
+        return
+
+    for key, value in items:
+        if not isinstance(value, pikepdf.Object):
+            continue
+        if value.is_indirect:
+            target = replace.get(value.objgen)
+            if target is not None:
+                obj[key] = target
+        elif isinstance(value, (pikepdf.Dictionary, pikepdf.Array)):
+            _rewrite_refs(value, replace)
+
+
+def dedupe_streams(pdf, max_passes=3):
+    """
+    Point every reference to a byte-identical stream (embedded fonts,
+    logos, ICC profiles ...) at a single copy. Duplicates become
+    unreferenced and are dropped by qpdf on save.
+
+    Several passes are made so parents of deduplicated streams (e.g. an
+    image whose /SMask was merged) can match too.
+    Returns the number of raw stream bytes no longer written.
+    """
+    saved = 0
+
+    for _ in range(max_passes):
+        canonical = {}
+        replace = {}
+
+        for obj in pdf.objects:
+            if not isinstance(obj, pikepdf.Stream):
+                continue
+            key = _stream_key(obj)
+            first = canonical.get(key)
+            if first is None:
+                canonical[key] = obj
+            else:
+                replace[obj.objgen] = first
+                saved += len(obj.read_raw_bytes())
+
+        if not replace:
+            break
+
+        for obj in pdf.objects:
+            if obj.objgen not in replace:
+                _rewrite_refs(obj, replace)
+        _rewrite_refs(pdf.Root, replace)
+
+    return saved
+
+
+def resolve_destination(pdf, item, page_index):
+    """
+    Page number (0-based) an outline item points to, or None.
+    page_index: {page objgen: index} for pdf.
+    """
+    dest = item.destination
+    if dest is None and item.action is not None and item.action.get("/S") == "/GoTo":
+        dest = item.action.get("/D")
+
+    # Named destination → look it up in /Dests or the /Names tree
+    if isinstance(dest, (pikepdf.Name, pikepdf.String)):
+        name = str(dest).lstrip("/")
+        target = None
+        if "/Dests" in pdf.Root:
+            target = pdf.Root.Dests.get("/" + name)
+        if target is None and "/Names" in pdf.Root and "/Dests" in pdf.Root.Names:
+            tree = pikepdf.NameTree(pdf.Root.Names.Dests)
+            target = tree.get(name)
+        if isinstance(target, pikepdf.Dictionary):
+            target = target.get("/D")
+        dest = target
+
+    if isinstance(dest, pikepdf.Array) and len(dest) > 0:
+        first = dest[0]
+        if first.is_indirect:
+            return page_index.get(first.objgen)
+        if isinstance(first, int):
+            return int(first)
+    return None
+
+
+def copy_outline(items, src, page_index, offset):
+    """Copy outline items of one source, shifting targets by offset."""
+    copied = []
+    for item in items:
+        idx = resolve_destination(src, item, page_index)
+        new = pikepdf.OutlineItem(
+            str(item.title),
+            idx + offset if idx is not None else None
+        )
+        new.children.extend(copy_outline(item.children, src, page_index, offset))
+        copied.append(new)
+    return copied
+
+
+def merge_pdf(input_files, output_path, linearize=False):
     """
     Merge multiple PDFs into one single file.
+
+    Built on qpdf/pikepdf: sources are opened straight from the upload
+    streams, pages are copied as foreign objects, streams that are
+    identical across inputs (fonts, logos) are stored once and the
+    result is written with compressed object streams. Each source is
+    closed as soon as its pages and bookmarks are copied (qpdf keeps what
+    the copied pages still need), so inputs are not all held at once.
     """
     try:
-        temp_dir = tempfile.mkdtemp(dir="/tmp")
-        merger = PdfMerger()
-        saved_paths = []
-
-        for file in input_files:
-            save_path = os.path.join(temp_dir, file.filename)
-            file.save(save_path)
-            saved_paths.append(save_path)
-            merger.append(save_path)
-
-        merger.write(output_path)
-        merger.close()
-
-        # Cleanup temporary files after merge
-        for path in saved_paths:
-            if os.path.exists(path):
-                os.remove(path)
-        os.rmdir(temp_dir)
+        merged = pikepdf.new()
+        outline = []
+
+        for n, file in enumerate(input_files, start=1):
+            with _open_source(file) as src:
+                offset = len(merged.pages)
+                merged.pages.extend(src.pages)
+
+                # Keep bookmarks like PdfMerger did
+                try:
+                    with src.open_outline() as src_outline:
+                        if src_outline.root:
+                            page_index = {p.obj.objgen: i for i, p in enumerate(src.pages)}
+                            outline.extend(copy_outline(src_outline.root, src, page_index, offset))
+                except Exception as e:
+                    log.warning("merge: bookmarks of input %d not copied: %s", n, e)
+
+        if outline:
+            with merged.open_outline() as merged_outline:
+                merged_outline.root.extend(outline)
+
+        dedupe_streams(merged)
+        write_pdf(merged, output_path, linearize=linearize)
 
     except Exception as e:
         raise RuntimeError(f"PDF merge failed: {e}")
@@ -1,51 +1,526 @@
+import io
 import os
-import tempfile
+import math
+import time
+import threading
+import numpy as np
 from PIL import Image
 import pytesseract
+import pikepdf
 import pypdfium2 as pdfium
+from reportlab.pdfgen import canvas
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from tools.pdf_output import write_pdf
+from tools.tracing import span
+
+try:
+    import tesserocr          # optional: in-process Tesseract C-API binding
+except ImportError:
+    tesserocr = None
 
 pytesseract.pytesseract.tesseract_cmd = "/usr/bin/tesseract"
 
-def ocr_pdf(input_path, output_path, output_type="text"):
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+IMAGE_EXTS = ["jpg", "jpeg", "png", "bmp", "webp"]
+
+# ===== Render / preprocessing settings =====
+# Pixel budget per page ≈ A4 at 300 DPI. Big drawings get a lower DPI,
+# small receipts a higher one, so tesseract sees roughly constant work.
+OCR_PIXEL_BUDGET = 2480 * 3508
+OCR_MIN_DPI = 72
+OCR_MAX_DPI = 400
+
+# Bradley adaptive threshold: pixel is ink if darker than local mean by 15%
+BINARIZE_WINDOW_DIV = 16
+BINARIZE_T = 0.15
+CROP_PADDING = 12
+
+# ===== Language routing (lang="auto") =====
+# Script detection (OSD) runs on a downscaled copy, ≈ A4 at 150 DPI is plenty
+AUTO_LANG = "auto"
+OSD_PIXEL_BUDGET = 1240 * 1754
+OSD_MIN_CONFIDENCE = 1.0
+# Used when OSD is unsure or finds a script without an installed model
+OCR_AUTO_FALLBACK = os.environ.get("OCR_AUTO_FALLBACK", "eng+guj")
+# OSD runs on this many pages per document; if they agree, the rest of
+# the document reuses their choice (0 = OSD on every page). Without
+# tesserocr each OSD is an extra tesseract process.
+OCR_AUTO_SAMPLE_PAGES = int(os.environ.get("OCR_AUTO_SAMPLE_PAGES", "3"))
+
+# Tesseract OSD script name → traineddata
+SCRIPT_LANGS = {
+    "Latin": "eng", "Gujarati": "guj", "Devanagari": "hin", "Bengali": "ben",
+    "Gurmukhi": "pan", "Tamil": "tam", "Telugu": "tel", "Kannada": "kan",
+    "Malayalam": "mal", "Oriya": "ori", "Arabic": "ara", "Cyrillic": "rus",
+    "Greek": "ell", "Hebrew": "heb", "Thai": "tha", "Han": "chi_sim",
+    "Japanese": "jpn", "Hangul": "kor",
+}
+
+# Invisible text layer font (bundled, Unicode-capable)
+FONT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "fronts", "DejaVuSans.ttf")
+TEXT_LAYER_FONT = "Helvetica"
+try:
+    pdfmetrics.registerFont(TTFont("DejaVuSans", FONT_PATH))
+    TEXT_LAYER_FONT = "DejaVuSans"
+except Exception:
+    pass
+
+
+def _render_scale(width_pt, height_pt, pixel_budget=OCR_PIXEL_BUDGET):
+    """
+    Pick a pdfium render scale (1.0 = 72 DPI) from the page size so the
+    rendered bitmap stays inside the pixel budget.
+    """
+    area_in2 = max((width_pt / 72.0) * (height_pt / 72.0), 1e-6)
+    dpi = math.sqrt(pixel_budget / area_in2)
+    dpi = max(OCR_MIN_DPI, min(OCR_MAX_DPI, dpi))
+    return dpi / 72.0
+
+
+def _fit_budget(img, pixel_budget=OCR_PIXEL_BUDGET):
+    """Downscale plain image uploads that are far above the pixel budget."""
+    w, h = img.size
+    if w * h <= pixel_budget:
+        return img
+    ratio = math.sqrt(pixel_budget / float(w * h))
+    return img.resize((max(1, int(w * ratio)), max(1, int(h * ratio))), Image.LANCZOS)
+
+
+def _box_sum(a, r, axis):
+    """Sliding window sum of size 2r+1 along one axis (clipped at the edges)."""
+    n = a.shape[axis]
+    c = np.cumsum(a, axis=axis, dtype=np.int32)
+    pad = [(0, 0), (0, 0)]
+    pad[axis] = (1, 0)
+    c = np.pad(c, pad)
+    idx = np.arange(n)
+    hi = np.minimum(idx + r + 1, n)
+    lo = np.maximum(idx - r, 0)
+    return np.take(c, hi, axis=axis) - np.take(c, lo, axis=axis)
+
+
+def _preprocess(img, crop=True):
+    """
+    Grayscale → adaptive binarization → blank margin crop (all vectorized).
+
+    Returns (image, (left, top)) where (left, top) is the crop offset in
+    the input image, or (None, (0, 0)) when the page has no ink at all.
+    """
+    gray = np.asarray(img.convert("L"), dtype=np.int32)
+    h, w = gray.shape
+
+    # Local mean through separable integral sums (int32 is enough here)
+    r = max(7, min(h, w) // BINARIZE_WINDOW_DIV // 2)
+    sums = _box_sum(_box_sum(gray, r, axis=0), r, axis=1)
+    rows = np.minimum(np.arange(h) + r + 1, h) - np.maximum(np.arange(h) - r, 0)
+    cols = np.minimum(np.arange(w) + r + 1, w) - np.maximum(np.arange(w) - r, 0)
+    area = rows[:, None] * cols[None, :]
+
+    ink = gray * area.astype(np.float32) < sums * np.float32(1.0 - BINARIZE_T)
 
+    if not ink.any():
+        return None, (0, 0)
+
+    left, top = 0, 0
+    if crop:
+        ys = np.flatnonzero(ink.any(axis=1))
+        xs = np.flatnonzero(ink.any(axis=0))
+        top = max(int(ys[0]) - CROP_PADDING, 0)
+        bottom = min(int(ys[-1]) + CROP_PADDING + 1, h)
+        left = max(int(xs[0]) - CROP_PADDING, 0)
+        right = min(int(xs[-1]) + CROP_PADDING + 1, w)
+        ink = ink[top:bottom, left:right]
+
+    out = np.where(ink, 0, 255).astype(np.uint8)
+    return Image.fromarray(out, mode="L"), (left, top)
+
+
+def _iter_pages(input_path):
+    """
+    Yield (pil_image, scale) for every page, rendering lazily one page at a
+    time so long documents never sit in memory as a list of bitmaps.
+    """
     ext = input_path.lower().split(".")[-1]
-    pages = []
 
-    if ext in ["jpg", "jpeg", "png", "bmp", "webp"]:
-        pages = [Image.open(input_path)]
+    if ext in IMAGE_EXTS:
+        # Plain images have no page size → no render scale / DPI hint
+        yield _fit_budget(Image.open(input_path)), None
+        return
 
-    else:
-        pdf = pdfium.PdfDocument(input_path)
-        n = len(pdf)
+    pdf = pdfium.PdfDocument(input_path)
+    try:
+        for i in range(len(pdf)):
+            with span("ocr.render", page=i + 1) as s:
+                page = pdf[i]
+                w, h = page.get_size()
+                scale = _render_scale(w, h)
+                pil = page.render(scale=scale).to_pil()
+                page.close()
+                s.set(dpi=round(scale * 72), pixels=pil.width * pil.height)
+            yield pil, scale
+    finally:
+        pdf.close()
+
+
+class TesseractEngine:
+    """
+    OCR engine layer.
+
+    With tesserocr installed, every worker thread keeps its own initialized
+    TessBaseAPI handle per language, so traineddata is loaded once and
+    images are passed in memory. Without it we fall back to pytesseract,
+    which spawns one tesseract process per call.
+    """
+
+    def __init__(self, tessdata=None):
+        self.tessdata = tessdata or os.environ.get("TESSDATA_PREFIX")
+        self._local = threading.local()
+
+    @property
+    def in_process(self):
+        return tesserocr is not None
+
+    def _api(self, lang, psm=None):
+        apis = getattr(self._local, "apis", None)
+        if apis is None:
+            apis = self._local.apis = {}
+
+        # One handle per language set, so switching languages between
+        # pages never reloads a model that was already used
+        api = apis.get((lang, psm))
+        if api is None:
+            kwargs = {"lang": lang}
+            if psm is not None:
+                kwargs["psm"] = psm
+            if self.tessdata:
+                kwargs["path"] = self.tessdata
+            api = tesserocr.PyTessBaseAPI(**kwargs)
+            apis[(lang, psm)] = api
+        return api
+
+    def languages(self):
+        """Installed traineddata names (without osd), empty if unknown."""
+        if getattr(self, "_languages", None) is None:
+            try:
+                if self.in_process:
+                    langs = tesserocr.get_languages(self.tessdata or "")[1]
+                else:
+                    langs = pytesseract.get_languages(config="")
+            except Exception:
+                langs = []
+            self._languages = {l for l in langs if l != "osd"}
+        return self._languages
+
+    def detect_script(self, img):
+        """(script name, confidence) from Tesseract OSD, or (None, 0)."""
+        with span("tesseract.osd", in_process=self.in_process) as s:
+            img = _fit_budget(img, OSD_PIXEL_BUDGET)
+            try:
+                if self.in_process:
+                    api = self._api("osd", psm=tesserocr.PSM.OSD_ONLY)
+                    try:
+                        api.SetImage(img)
+                        found = api.DetectOrientationScript() or {}
+                    finally:
+                        api.Clear()
+                    script, conf = found.get("script_name"), found.get("script_conf", 0)
+                else:
+                    found = pytesseract.image_to_osd(img, output_type=pytesseract.Output.DICT)
+                    script, conf = found.get("script"), found.get("script_conf", 0)
+            except Exception:
+                # Too little text for OSD
+                script, conf = None, 0
+            s.set(script=script, confidence=conf)
+            return script, float(conf or 0)
+
+    def image_to_string(self, img, lang="eng", dpi=None):
+        with span("tesseract.text", lang=lang, in_process=self.in_process):
+            return self._image_to_string(img, lang, dpi)
+
+    def _image_to_string(self, img, lang, dpi):
+        if not self.in_process:
+            config = f"--dpi {int(dpi)}" if dpi else ""
+            return pytesseract.image_to_string(img, lang=lang, config=config)
+
+        api = self._api(lang)
+        try:
+            api.SetImage(img)
+            if dpi:
+                api.SetSourceResolution(int(dpi))
+            return api.GetUTF8Text()
+        finally:
+            api.Clear()
+
+    def image_to_words(self, img, lang="eng", dpi=None):
+        """
+        Word boxes in image pixels:
+        [{"text", "left", "top", "width", "height", "conf", "line"}]
+        "line" is a sequential text-line id within the image.
+        """
+        with span("tesseract.words", lang=lang, in_process=self.in_process):
+            return self._image_to_words(img, lang, dpi)
 
-        for i in range(n):
-            page = pdf[i]
-            pil = page.render(scale=2).to_pil()
-            pages.append(pil)
+    def _image_to_words(self, img, lang, dpi):
+        if not self.in_process:
+            return self._pytesseract_words(img, lang, dpi)
+
+        level = tesserocr.RIL.WORD
+        api = self._api(lang)
+        words = []
+        try:
+            api.SetImage(img)
+            if dpi:
+                api.SetSourceResolution(int(dpi))
+            api.Recognize()
+
+            it = api.GetIterator()
+            line = -1
+            for r in tesserocr.iterate_level(it, level):
+                if r.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                    line += 1
+                text = (r.GetUTF8Text(level) or "").strip()
+                box = r.BoundingBox(level)
+                if not text or not box:
+                    continue
+                x1, y1, x2, y2 = box
+                words.append({
+                    "text": text, "left": x1, "top": y1,
+                    "width": x2 - x1, "height": y2 - y1,
+                    "conf": r.Confidence(level), "line": max(line, 0),
+                })
+        finally:
+            api.Clear()
+        return words
+
+    @staticmethod
+    def _pytesseract_words(img, lang, dpi):
+        config = f"--dpi {int(dpi)}" if dpi else ""
+        data = pytesseract.image_to_data(
+            img, lang=lang, config=config, output_type=pytesseract.Output.DICT
+        )
+        words = []
+        lines = {}
+        for i, text in enumerate(data["text"]):
+            text = text.strip()
+            if not text or float(data["conf"][i]) < 0:
+                continue
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            words.append({
+                "text": text, "left": data["left"][i], "top": data["top"][i],
+                "width": data["width"][i], "height": data["height"][i],
+                "conf": float(data["conf"][i]),
+                "line": lines.setdefault(key, len(lines)),
+            })
+        return words
+
+
+OCR_ENGINE = TesseractEngine()
+
+
+def parse_lang(lang):
+    """
+    "eng", "eng+guj", "eng,guj", ["eng", "guj"] → "eng+guj";
+    "auto" (or empty) stays AUTO_LANG. Unknown models raise ValueError
+    when the installed list is known.
+    """
+    if not lang:
+        return "eng"
+    if isinstance(lang, str):
+        lang = lang.replace(",", "+").split("+")
+    langs = [l.strip() for l in lang if l.strip()]
+    if langs == [AUTO_LANG]:
+        return AUTO_LANG
+
+    installed = OCR_ENGINE.languages()
+    missing = [l for l in langs if installed and l not in installed]
+    if missing:
+        raise ValueError(f"OCR language not installed: {', '.join(missing)}")
+    return "+".join(dict.fromkeys(langs))
+
+
+def _auto_fallback():
+    installed = OCR_ENGINE.languages()
+    langs = [l for l in OCR_AUTO_FALLBACK.split("+") if not installed or l in installed]
+    return "+".join(langs) or "eng"
+
+
+def page_lang(img, lang):
+    """
+    Language set for one (preprocessed) page. Fixed languages pass
+    through; AUTO_LANG runs OSD and picks the single model for the
+    detected script, or the fallback set when OSD is unsure.
+    """
+    if lang != AUTO_LANG:
+        return lang
+    script, conf = OCR_ENGINE.detect_script(img)
+    chosen = SCRIPT_LANGS.get(script)
+    installed = OCR_ENGINE.languages()
+    if conf < OSD_MIN_CONFIDENCE or not chosen or (installed and chosen not in installed):
+        return _auto_fallback()
+    return chosen
+
+
+class _LangRouter:
+    """
+    page_lang() for one document, with OSD limited to the first
+    OCR_AUTO_SAMPLE_PAGES pages when they all pick the same languages.
+    Mixed-script documents keep detecting page by page.
+    """
+
+    def __init__(self, lang):
+        self.lang = lang
+        self.chosen = []
+
+    def __call__(self, img):
+        if self.lang != AUTO_LANG:
+            return self.lang
+        if (OCR_AUTO_SAMPLE_PAGES and len(self.chosen) >= OCR_AUTO_SAMPLE_PAGES
+                and len(set(self.chosen)) == 1):
+            return self.chosen[0]
+        langs = page_lang(img, self.lang)
+        self.chosen.append(langs)
+        return langs
+
+
+def _draw_text_layer(c, words, scale, offset, page_height):
+    """
+    Draw OCR words as invisible text (render mode 3) at their pixel boxes,
+    converted back to PDF points of the displayed page.
+    """
+    ox, oy = offset
+    for word in words:
+        text = word["text"]
+        x = (word["left"] + ox) / scale
+        y = page_height - (word["top"] + oy + word["height"]) / scale
+        w = word["width"] / scale
+        size = max(word["height"] / scale, 1)
+
+        tw = pdfmetrics.stringWidth(text, TEXT_LAYER_FONT, size)
+        t = c.beginText()
+        t.setTextRenderMode(3)
+        t.setFont(TEXT_LAYER_FONT, size)
+        if tw > 0:
+            t.setHorizScale(100.0 * w / tw)
+        t.setTextOrigin(x, y)
+        t.textOut(text)
+        c.drawText(t)
+
+
+def _searchable_pdf(input_path, output_path, linearize=False, lang="eng"):
+    """
+    Build the OCR PDF by overlaying an invisible text layer on the original
+    pages. Original content (vectors, images, fonts) is kept untouched.
+    """
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf)
+    has_text = []
+    route = _LangRouter(lang)
+
+    for n, (img, scale) in enumerate(_iter_pages(input_path), start=1):
+        with span("ocr.page", page=n) as s:
+            pw, ph = img.width / scale, img.height / scale
+            c.setPageSize((pw, ph))
+
+            clean, offset = _preprocess(img)
+            words = []
+            if clean is not None:
+                page_langs = route(clean)
+                words = OCR_ENGINE.image_to_words(clean, lang=page_langs, dpi=scale * 72)
+                s.set(lang=page_langs)
+            _draw_text_layer(c, words, scale, offset, ph)
+            has_text.append(bool(words))
+            c.showPage()
+            s.set(words=len(words))
+
+    c.save()
+    buf.seek(0)
+
+    with pikepdf.open(input_path) as pdf, pikepdf.open(buf) as layer:
+        for page, text_page, flag in zip(pdf.pages, layer.pages, has_text):
+            if flag:
+                page.add_overlay(text_page, pikepdf.Rectangle(*page.cropbox))
+        write_pdf(pdf, output_path, linearize=linearize)
+
+
+def iter_page_words(input_path, lang="eng"):
+    """
+    One OCR pass, nothing written to disk: yields (page_number, words)
+    with word boxes (see TesseractEngine.image_to_words) in pixels of the
+    rendered page. lang: see parse_lang ("auto" = per-page detection).
+    """
+    route = _LangRouter(parse_lang(lang))
+    for n, (img, scale) in enumerate(_iter_pages(input_path), start=1):
+        with span("ocr.page", page=n) as s:
+            clean, (ox, oy) = _preprocess(img)
+            words = []
+            if clean is not None:
+                dpi = scale * 72 if scale else None
+                page_langs = route(clean)
+                words = OCR_ENGINE.image_to_words(clean, lang=page_langs, dpi=dpi)
+                s.set(lang=page_langs)
+                for word in words:
+                    word["left"] += ox
+                    word["top"] += oy
+            s.set(words=len(words))
+        yield n, words
+
+
+def iter_page_text(input_path, lang="eng"):
+    """
+    Plain-text OCR page by page: yields (page_number, text, seconds) as
+    soon as each page is recognized, in page order. Closing the generator
+    stops the remaining pages (and closes the document).
+    lang: see parse_lang ("auto" = per-page detection).
+    """
+    route = _LangRouter(parse_lang(lang))
+    pages = _iter_pages(input_path)
+    try:
+        started = time.perf_counter()
+        for n, (img, scale) in enumerate(pages, start=1):
+            with span("ocr.page", page=n) as s:
+                clean, _ = _preprocess(img)
+                text = ""
+                if clean is not None:
+                    dpi = scale * 72 if scale else None
+                    page_langs = route(clean)
+                    text = OCR_ENGINE.image_to_string(clean, lang=page_langs, dpi=dpi)
+                    s.set(lang=page_langs)
+            now = time.perf_counter()
+            yield n, text, now - started
+            started = time.perf_counter()
+    finally:
+        pages.close()
+
+
+def ocr_pdf(input_path, output_path, output_type="text", linearize=False, lang="eng"):
+    """
+    lang: one or more traineddata names ("eng", "eng+guj", "eng,guj")
+    or "auto" to pick the model per page from the detected script
+    (detection sampled per document, see OCR_AUTO_SAMPLE_PAGES).
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    ext = input_path.lower().split(".")[-1]
+    lang = parse_lang(lang)
 
     if output_type == "text":
-        extracted = []
-        for img in pages:
-            extracted.append(pytesseract.image_to_string(img))
+        extracted = [text for _, text, _ in iter_page_text(input_path, lang)]
 
         with open(output_path, "w", encoding="utf-8") as f:
             f.write("\n\n--- PAGE BREAK ---\n\n".join(extracted))
 
+    elif ext in IMAGE_EXTS:
+        # Plain image → single page PDF straight from tesseract
+        img, _ = next(_iter_pages(input_path))
+        img_lang = lang
+        if lang == AUTO_LANG:
+            clean, _ = _preprocess(img, crop=False)
+            img_lang = page_lang(clean, lang) if clean is not None else _auto_fallback()
+        pdf_bytes = pytesseract.image_to_pdf_or_hocr(img, lang=img_lang, extension="pdf")
+        with open(output_path, "wb") as f:
+            f.write(pdf_bytes)
+
     else:
-        from PyPDF2 import PdfMerger
-        merger = PdfMerger()
-
-        with tempfile.TemporaryDirectory() as tmp:
-            for idx, img in enumerate(pages):
-                pdf_bytes = pytesseract.image_to_pdf_or_hocr(img, extension="pdf")
-                temp_page = os.path.join(tmp, f"{idx}.pdf")
-                with open(temp_page, "wb") as f:
-                    f.write(pdf_bytes)
-                merger.append(temp_page)
-
-            merger.write(output_path)
-            merger.close()
-
-def run_ocr(input_path, output_path, output_type="text"):
-    return ocr_pdf(input_path, output_path, output_type)
+        _searchable_pdf(input_path, output_path, linearize=linearize, lang=lang)
+
+def run_ocr(input_path, output_path, output_type="text", linearize=False, lang="eng"):
+    return ocr_pdf(input_path, output_path, output_type, linearize=linearize, lang=lang)
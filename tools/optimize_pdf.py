@@ -0,0 +1,166 @@
+import io
+import os
+import re
+import base64
+import pikepdf
+from tools.pdf_output import write_pdf
+from tools.merge_pdf import dedupe_streams
+from tools.tracing import span
+
+
+class _ByteCounter(io.RawIOBase):
+    """Write-only sink that only counts, for measuring a save."""
+
+    def __init__(self):
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+
+def _saved_size(pdf, **save_options):
+    """
+    Size pdf would have if saved now. Defaults keep every stream exactly
+    as it is encoded and object streams as they are, so only what the
+    previous step changed shows up.
+    """
+    options = {"object_stream_mode": pikepdf.ObjectStreamMode.preserve,
+               "compress_streams": False,
+               "stream_decode_level": pikepdf.StreamDecodeLevel.none}
+    options.update(save_options)
+    sink = _ByteCounter()
+    pdf.save(sink, **options)
+    return sink.size
+
+
+ASCII_FILTERS = ("/ASCII85Decode", "/A85", "/ASCIIHexDecode", "/AHx")
+
+
+def _ascii_decode(name, data):
+    data = re.sub(rb"\s", b"", data)
+    if name in ("/ASCIIHexDecode", "/AHx"):
+        data = data.rstrip(b">")
+        if len(data) % 2:
+            data += b"0"
+        return bytes.fromhex(data.decode("ascii"))
+    if data.startswith(b"<~"):
+        data = data[2:]
+    return base64.a85decode(data.rstrip(b"~>").rstrip(b"~"))
+
+
+def _strip_ascii_layers(pdf):
+    """
+    Remove leading ASCII85 / ASCIIHex layers in front of filters qpdf
+    won't decode (JPEG, JPEG 2000, JBIG2, CCITT). Only the text armour
+    goes; the image data underneath stays byte for byte the same.
+    Returns the number of streams changed.
+    """
+    changed = 0
+    for obj in pdf.objects:
+        if not isinstance(obj, pikepdf.Stream):
+            continue
+        filters = obj.get("/Filter")
+        if not isinstance(filters, pikepdf.Array) or len(filters) < 2:
+            continue
+        filters = [str(f) for f in filters]
+        if filters[0] not in ASCII_FILTERS:
+            continue
+
+        try:
+            data = _ascii_decode(filters[0], obj.read_raw_bytes())
+        except ValueError:
+            continue
+
+        # /DecodeParms is one entry per filter; the ASCII filters take none
+        parms = obj.get("/DecodeParms")
+        rest_parms = list(parms)[1:] if isinstance(parms, pikepdf.Array) else []
+        if not any(isinstance(p, pikepdf.Dictionary) for p in rest_parms):
+            rest_parms = []
+        rest = [pikepdf.Name(f) for f in filters[1:]]
+        if len(rest) == 1:
+            obj.write(data, filter=rest[0], decode_parms=rest_parms[0] if rest_parms else None)
+        else:
+            obj.write(data, filter=pikepdf.Array(rest),
+                      decode_parms=pikepdf.Array(rest_parms) if rest_parms else None)
+        changed += 1
+    return changed
+
+
+def optimize_pdf(input_path, output_path, linearize=False, report=False):
+    """
+    Lossless structural optimization, step by step:
+
+    1. unreferenced_objects: rewrite keeps only reachable objects (drops
+       old incremental-update revisions and orphans)
+    2. unused_resources: fonts / images / ... a page's content never uses
+       (skipped when it would not make the file smaller, see below)
+    3. duplicate_streams: byte-identical streams stored once
+    4. flate: uncompressed (or LZW / ASCII / RunLength) streams → Flate,
+       Flate streams re-deflated, ASCII armour in front of image codecs
+       removed. JPEG / JPEG 2000 / JBIG2 / CCITT data is never decoded,
+       so image quality is untouched.
+    5. object_streams: non-stream objects packed into compressed object
+       streams (plus linearization when asked for)
+
+    Returns {"original", "final"}. report=True adds "saved": {step: bytes};
+    that costs an extra in-memory save after every step, so it is off by
+    default.
+    """
+    original = os.path.getsize(input_path)
+    saved = {}
+    size = original
+    flate = {"compress_streams": True, "recompress_flate": True,
+             "stream_decode_level": pikepdf.StreamDecodeLevel.generalized}
+
+    pdf = pikepdf.open(input_path)
+    try:
+        def measure(step, **save_options):
+            nonlocal size
+            if report:
+                before, size = size, _saved_size(pdf, **save_options)
+                saved[step] = before - size
+
+        with span("optimize.unreferenced_objects"):
+            # nothing to do here: the final save only writes reachable objects
+            measure("unreferenced_objects")
+
+        with span("optimize.unused_resources"):
+            # qpdf first copies inherited / shared /Resources down into every
+            # page, which can cost more than the unused entries it drops. So
+            # the step is measured even without report, and when it doesn't
+            # shrink the file we start over from the untouched input (nothing
+            # before this step changes the document).
+            before = size if report else _saved_size(pdf)
+            pdf.remove_unreferenced_resources()
+            after = _saved_size(pdf)
+            if after >= before:
+                pdf.close()
+                pdf = pikepdf.open(input_path)
+                after = before
+            size = after
+            if report:
+                saved["unused_resources"] = before - after
+
+        with span("optimize.duplicate_streams"):
+            dedupe_streams(pdf)
+            measure("duplicate_streams")
+
+        with span("optimize.flate"):
+            _strip_ascii_layers(pdf)
+            measure("flate", **flate)
+
+        with span("optimize.object_streams"):
+            final = write_pdf(pdf, output_path, linearize=linearize, **flate)
+            if report:
+                saved["object_streams"] = size - final
+    finally:
+        pdf.close()
+
+    result = {"original": original, "final": final}
+    if report:
+        result["saved"] = saved
+    return result
@@ -1,11 +1,11 @@
 from PyPDF2 import PdfReader, PdfWriter
+from tools.pdf_output import write_pdf
 
-def organize_pdf(input_path, output_path, order):
+def organize_pdf(input_path, output_path, order, linearize=False):
     reader = PdfReader(input_path)
     writer = PdfWriter()
 
     for index in order:
         writer.add_page(reader.pages[index])
 
-    with open(output_path, "wb") as f:
-        writer.write(f)
+    write_pdf(writer, output_path, linearize=linearize)
@@ -0,0 +1,50 @@
+import io
+import os
+import pikepdf
+
+
+def write_pdf(doc, output_path, linearize=False, **save_options):
+    """
+    Shared PDF output writer for every PDF-producing tool.
+
+    doc: PyPDF2 PdfWriter or pikepdf.Pdf
+    linearize: True → linearized ("fast web view") file with compressed
+               object streams, so viewers can show page 1 before the
+               whole file is downloaded.
+    save_options: extra pikepdf save() options (e.g. encryption)
+
+    pikepdf documents always get object streams. A PyPDF2 writer is
+    written as-is unless linearize is requested, then it is passed
+    through qpdf once.
+    Returns the output size in bytes.
+    """
+    if isinstance(doc, pikepdf.Pdf):
+        doc.save(
+            output_path,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate,
+            linearize=linearize,
+            **save_options
+        )
+
+    elif not linearize and not save_options:
+        with open(output_path, "wb") as f:
+            doc.write(f)
+
+    else:
+        buf = io.BytesIO()
+        doc.write(buf)
+        buf.seek(0)
+        with pikepdf.open(buf) as pdf:
+            write_pdf(pdf, output_path, linearize=linearize, **save_options)
+
+    return os.path.getsize(output_path)
+
+
+def optimize_file(path, linearize=False):
+    """
+    Rewrite an existing PDF file (e.g. produced by Ghostscript) in place
+    with object streams and optional linearization.
+    Returns the output size in bytes.
+    """
+    with pikepdf.open(path, allow_overwriting_input=True) as pdf:
+        return write_pdf(pdf, path, linearize=linearize)
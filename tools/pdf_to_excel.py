@@ -1,18 +1,83 @@
-import os
+import numpy as np
 import pdfplumber
 import pandas as pd
-import tempfile
-from tools.ocr_pdf import run_ocr
+from tools.ocr_pdf import iter_page_words
+from tools.tracing import span
 
+# ===== OCR table reconstruction settings (relative to median word height) =====
+ROW_GAP = 0.5          # centre-to-centre jump that starts a new row
+COLUMN_GAP = 1.2       # narrowest empty vertical strip that separates columns
+COLUMN_NOISE = 0.1     # strips used by ≤ this share of rows still count as empty
 
-def pdf_to_excel(input_pdf_path: str, output_excel_path: str):
+
+def _cluster_rows(cy, row_gap):
+    """Row id per word: sort by centre y, break where the jump > row_gap."""
+    order = np.argsort(cy, kind="stable")
+    breaks = np.concatenate(([0], np.diff(cy[order]) > row_gap)).astype(np.int64)
+    rows = np.empty(len(cy), dtype=np.int64)
+    rows[order] = np.cumsum(breaks)
+    return rows
+
+
+def _column_cuts(left, right, n_rows, min_gap):
+    """
+    x positions that split the page into columns.
+
+    Gap histogram: how many words cover each pixel column (difference
+    array + cumsum). Runs where (almost) no row has ink, at least
+    min_gap wide and between the first and last word, are gutters;
+    each gutter's middle is a cut.
+    """
+    width = int(right.max()) + 2
+    cover = np.zeros(width, dtype=np.int64)
+    np.add.at(cover, left, 1)
+    np.add.at(cover, right, -1)
+    cover = np.cumsum(cover)
+
+    empty = (cover <= COLUMN_NOISE * n_rows).astype(np.int8)
+    edges = np.diff(np.concatenate(([0], empty, [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    keep = (ends - starts >= min_gap) & (starts > left.min()) & (ends <= right.max())
+    return (starts[keep] + ends[keep]) // 2
+
+
+def words_to_table(words):
+    """OCR word boxes of one page → list of rows (lists of cell strings)."""
+    words = [w for w in words if w["text"].strip()]
+    if not words:
+        return []
+
+    left = np.array([w["left"] for w in words], dtype=np.int64)
+    top = np.array([w["top"] for w in words], dtype=np.int64)
+    width = np.array([w["width"] for w in words], dtype=np.int64)
+    height = np.array([w["height"] for w in words], dtype=np.int64)
+    right = left + np.maximum(width, 1)
+
+    med = max(float(np.median(height)), 1.0)
+    rows = _cluster_rows(top + height / 2, ROW_GAP * med)
+    cuts = _column_cuts(left, right, int(rows.max()) + 1, COLUMN_GAP * med)
+    cols = np.searchsorted(cuts, left + width / 2)
+
+    n_rows, n_cols = int(rows.max()) + 1, len(cuts) + 1
+    cells = [[[] for _ in range(n_cols)] for _ in range(n_rows)]
+    for i in np.lexsort((left, cols, rows)):
+        cells[rows[i]][cols[i]].append(words[i]["text"])
+
+    return [[" ".join(c) for c in row] for row in cells]
+
+
+def pdf_to_excel(input_pdf_path: str, output_excel_path: str, lang: str = "eng"):
     """
     Smart PDF → Excel Converter
 
     Logic:
     1️⃣ Try structured table extraction using pdfplumber
-    2️⃣ If no tables found → OCR fallback
+    2️⃣ If no tables found → OCR fallback (word boxes → rows + columns)
     3️⃣ If OCR also empty → still generate Excel with Notice
+
+    lang is the OCR language for step 2 ("eng+guj", "auto", ...).
     """
 
     all_tables = []
@@ -23,7 +88,9 @@ def pdf_to_excel(input_pdf_path: str, output_excel_path: str):
     try:
         with pdfplumber.open(input_pdf_path) as pdf:
             for page_number, page in enumerate(pdf.pages, start=1):
-                tables = page.extract_tables()
+                with span("pdf_to_excel.page", page=page_number) as s:
+                    tables = page.extract_tables()
+                    s.set(tables=len(tables))
 
                 for table in tables:
                     if not table or len(table) < 2:
@@ -45,35 +112,32 @@ def pdf_to_excel(input_pdf_path: str, output_excel_path: str):
 
 
     # ===============================
-    # STEP 2: OCR FALLBACK (TEXT BASED)
+    # STEP 2: OCR FALLBACK (WORD BOXES, IN MEMORY)
     # ===============================
-    with tempfile.TemporaryDirectory() as tmp:
-        ocr_text_path = os.path.join(tmp, "ocr.txt")
-
-        # Run OCR → TEXT
-        run_ocr(input_pdf_path, ocr_text_path, output_type="text")
-
-        # Read OCR output
-        if os.path.exists(ocr_text_path):
-            with open(ocr_text_path, "r", encoding="utf-8") as f:
-                lines = [line.strip() for line in f.readlines() if line.strip()]
-        else:
-            lines = []
-
-        # ===============================
-        # STEP 3: IF OCR ALSO EMPTY → NOTICE EXCEL
-        # ===============================
-        if not lines:
-            df = pd.DataFrame(
-                ["No structured table found. This PDF may be scanned or image-based."],
-                columns=["Notice"]
-            )
-            df.to_excel(output_excel_path, index=False)
-            return output_excel_path
+    pages = []
+    with span("pdf_to_excel.ocr_fallback"):
+        for page_number, words in iter_page_words(input_pdf_path, lang):
+            rows = words_to_table(words)
+            if not rows:
+                continue
+            df = pd.DataFrame(rows, columns=[f"Column {i + 1}" for i in range(len(rows[0]))])
+            df["__page__"] = page_number
+            pages.append(df)
 
-        # ===============================
-        # STEP 4: OCR TEXT → EXCEL
-        # ===============================
-        df = pd.DataFrame(lines, columns=["Extracted_Text"])
+    # ===============================
+    # STEP 3: IF OCR ALSO EMPTY → NOTICE EXCEL
+    # ===============================
+    if not pages:
+        df = pd.DataFrame(
+            ["No structured table found. This PDF may be scanned or image-based."],
+            columns=["Notice"]
+        )
         df.to_excel(output_excel_path, index=False)
-        return output_excel_path
\ No newline at end of file
+        return output_excel_path
+
+    # ===============================
+    # STEP 4: OCR TABLE → EXCEL
+    # ===============================
+    df = pd.concat(pages, ignore_index=True)
+    df.to_excel(output_excel_path, index=False)
+    return output_excel_path
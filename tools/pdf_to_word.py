@@ -1,13 +1,374 @@
 import os
+import re
+import ctypes
+from bisect import bisect_left, bisect_right
+from collections import Counter
 from pdf2docx import Converter
+from docx import Document
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+from tools.tracing import span
 
-def pdf_to_word(input_pdf_path, output_docx_path):
+MODES = ("layout", "text")
+
+# ===== Text mode settings (sizes in PDF points) =====
+HEADING_RATIO = 1.2      # font size vs. page body size that makes a heading
+TITLE_RATIO = 1.6        # ... a level 1 heading
+HEADING_MAX_CHARS = 120
+LINE_GAP = 0.8           # max space between lines of one paragraph (x font size)
+RUN_GAP = 1.5            # max space between runs of one line (x font size)
+RULE_WIDTH = 3.0         # thinner than this = a ruling line, not a box
+SNAP = 2.0               # rule positions closer than this are one grid line
+MAX_RULES = 1500         # more path objects than this = a drawing, not a table
+FONT_BOLD_FLAG = 1 << 18  # FXFONT_FORCE_BOLD
+
+_XML_INVALID = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _clean(text):
+    # pdfium reports characters outside the BMP as two UTF-16 halves
+    text = text.encode("utf-16-le", "surrogatepass").decode("utf-16-le", "replace")
+    return _XML_INVALID.sub("", text)
+
+
+def _bold(textpage, index):
+    flags = ctypes.c_int(0)
+    name = ctypes.create_string_buffer(128)
+    pdfium_c.FPDFText_GetFontInfo(textpage, index, name, len(name), ctypes.byref(flags))
+    name = name.value.decode("utf-8", "ignore")
+    return bool(flags.value & FONT_BOLD_FLAG) or any(w in name for w in ("Bold", "Black", "Heavy"))
+
+
+def _union(a, b):
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def _text_lines(textpage, tables):
+    """
+    Characters → text lines [{"bbox", "text", "size", "bold", "cell"}].
+    A line ends at a line break, a wide horizontal gap or a table cell
+    border; "cell" is (table, row, col) for text inside a ruled table.
     """
-    Convert PDF to editable Word (DOCX) file using pdf2docx.
+    raw = textpage.raw
+    rect = pdfium_c.FS_RECTF()
+    get_unicode = pdfium_c.FPDFText_GetUnicode
+    get_box = pdfium_c.FPDFText_GetLooseCharBox
+    get_size = pdfium_c.FPDFText_GetFontSize
+    lines, cur = [], None
+
+    for i in range(textpage.count_chars()):
+        ch = chr(get_unicode(raw, i))
+        if ch in "\r\n":
+            cur = None
+            continue
+        if ch.isspace():
+            if cur is not None and cur["text"][-1] != " ":
+                cur["text"].append(" ")
+            continue
+
+        # Loose box = advance width x font height, so letters touch
+        get_box(raw, i, rect)
+        cl, cb, cr, ct = rect.left, rect.bottom, rect.right, rect.top
+        cell = _cell_at(tables, (cl + cr) / 2, (cb + ct) / 2) if tables else None
+
+        if cur is not None:
+            l, b, r, t = cur["bbox"]
+            size = cur["size"]
+            gap = cl - r
+            if (-size <= gap <= RUN_GAP * size and cell == cur["cell"]
+                    and min(t, ct) - max(b, cb) > 0.3 * min(t - b, ct - cb)):
+                if gap > 0.2 * size and cur["text"][-1] != " ":
+                    cur["text"].append(" ")
+                cur["text"].append(ch)
+                cur["bbox"] = (l if l < cl else cl, b if b < cb else cb,
+                               r if r > cr else cr, t if t > ct else ct)
+                cur["last"] = i
+                continue
+
+        size = get_size(raw, i) or (ct - cb)
+        cur = {"bbox": (cl, cb, cr, ct), "text": [ch], "size": size, "cell": cell, "first": i, "last": i}
+        lines.append(cur)
+
+    for line in lines:
+        line["text"] = _clean("".join(line["text"])).strip()
+        # Sampled at start / middle / end: headings are uniform anyway
+        first, last = line.pop("first"), line.pop("last")
+        samples = {first, (first + last) // 2, last}
+        line["size"] = round(max(get_size(raw, i) for i in samples) or line["size"], 1)
+        line["bold"] = all(_bold(raw, i) for i in samples)
+    return [line for line in lines if line["text"]]
+
+
+def _paragraphs(lines):
     """
+    Lines → paragraph blocks, top to bottom: a line joins the block whose
+    last line sits right above it (small gap, overlapping x range, same
+    font size and weight), so side-by-side columns stay separate.
+    """
+    blocks = []
+    for line in sorted(lines, key=lambda ln: -ln["bbox"][3]):
+        l, b, r, t = line["bbox"]
+        for block in reversed(blocks):
+            last = block["lines"][-1]
+            ll, lb, lr, lt = last["bbox"]
+            if (-0.3 * line["size"] <= lb - t <= LINE_GAP * line["size"]
+                    and min(r, lr) > max(l, ll)
+                    and abs(last["size"] - line["size"]) < 0.6 and last["bold"] == line["bold"]):
+                block["lines"].append(line)
+                block["bbox"] = _union(block["bbox"], line["bbox"])
+                break
+        else:
+            blocks.append({"kind": "text", "lines": [line], "bbox": line["bbox"]})
+    return blocks
+
+
+def _snap(values):
+    """Sorted values with near-duplicates (< SNAP apart) merged."""
+    out = []
+    for v in sorted(values):
+        if not out or v - out[-1] >= SNAP:
+            out.append(v)
+    return out
+
+
+def _rule_segments(page):
+    """Ruling segments from path objects: thin paths, plus the edges of boxes."""
+    segments = []
+    for obj in page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_PATH]):
+        x0, y0, x1, y1 = obj.get_pos()
+        if y1 - y0 <= RULE_WIDTH or x1 - x0 <= RULE_WIDTH:
+            segments.append((x0, y0, x1, y1))
+        else:
+            segments += [(x0, y0, x1, y0), (x0, y1, x1, y1), (x0, y0, x0, y1), (x1, y0, x1, y1)]
+        if len(segments) > MAX_RULES:
+            return []
+    return segments
+
+
+def _find_tables(segments):
+    """
+    Ruled tables: segments are grouped by touching bounding boxes; a
+    group with at least 2 rows and 2 columns of grid lines is a table.
+    Candidate pairs come from sorted coordinates, not from trying every
+    pair: parallel rules are swept along their thin axis, crossings are
+    looked up by x with bisect.
+    """
+    parent = list(range(len(segments)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def join_if_touching(i, j):
+        a, b = segments[i], segments[j]
+        if (a[0] - SNAP <= b[2] and b[0] - SNAP <= a[2]
+                and a[1] - SNAP <= b[3] and b[1] - SNAP <= a[3]):
+            parent[find(i)] = find(j)
+
+    # Every segment is thin in y (flat) or thin in x (tall)
+    flat = [i for i, s in enumerate(segments) if s[3] - s[1] <= RULE_WIDTH]
+    tall = [i for i, s in enumerate(segments) if s[3] - s[1] > RULE_WIDTH]
+
+    for group, lo, hi in ((flat, 1, 3), (tall, 0, 2)):
+        group.sort(key=lambda i: segments[i][lo])
+        for n, i in enumerate(group):
+            for j in group[n + 1:]:
+                if segments[j][lo] > segments[i][hi] + SNAP:
+                    break
+                join_if_touching(i, j)
+
+    # tall is sorted by x0 now; a tall segment is at most RULE_WIDTH wide
+    tall_x = [segments[i][0] for i in tall]
+    for i in flat:
+        x0, _, x1, _ = segments[i]
+        start = bisect_left(tall_x, x0 - SNAP - RULE_WIDTH)
+        for j in tall[start:bisect_right(tall_x, x1 + SNAP)]:
+            join_if_touching(i, j)
+
+    groups = {}
+    for i, seg in enumerate(segments):
+        groups.setdefault(find(i), []).append(seg)
+
+    tables = []
+    for segs in groups.values():
+        xs = _snap((x0 + x1) / 2 for x0, y0, x1, y1 in segs if x1 - x0 <= RULE_WIDTH)
+        ys = _snap((y0 + y1) / 2 for x0, y0, x1, y1 in segs if y1 - y0 <= RULE_WIDTH)
+        if len(xs) < 3 or len(ys) < 3:
+            continue
+        tables.append({"kind": "table", "bbox": (xs[0], ys[0], xs[-1], ys[-1]),
+                       "xs": xs, "ys": ys, "cells": {}})
+    return tables
+
+
+def _cell_at(tables, x, y):
+    """(table index, row, col) of the ruled table cell at x, y, or None."""
+    for n, table in enumerate(tables):
+        x0, y0, x1, y1 = table["bbox"]
+        if x0 <= x <= x1 and y0 <= y <= y1:
+            xs, ys = table["xs"], table["ys"]
+            col = min(max(bisect_right(xs, x) - 1, 0), len(xs) - 2)
+            row = (len(ys) - 2) - min(max(bisect_right(ys, y) - 1, 0), len(ys) - 2)
+            return n, row, col
+    return None
+
+
+def _table_rows(table):
+    n_rows, n_cols = len(table["ys"]) - 1, len(table["xs"]) - 1
+    rows = [[" ".join(table["cells"].get((r, c), [])) for c in range(n_cols)]
+            for r in range(n_rows)]
+    return [row for row in rows if any(row)]
+
+
+def _split_bands(items, axis):
+    """Groups of items separated by empty bands: axis 0 = columns, 1 = rows."""
+    if axis == 0:
+        spans = sorted(((i["bbox"][0], i["bbox"][2], i) for i in items), key=lambda s: s[0])
+    else:
+        spans = sorted(((-i["bbox"][3], -i["bbox"][1], i) for i in items), key=lambda s: s[0])
+
+    groups, end = [], None
+    for lo, hi, item in spans:
+        if end is None or lo > end:
+            groups.append([item])
+            end = hi
+        else:
+            groups[-1].append(item)
+            end = max(end, hi)
+    return groups
+
+
+def _reading_order(items):
+    """XY-cut: split at column gutters first, then at horizontal gaps."""
+    if len(items) <= 1:
+        return items
+    for axis in (0, 1):
+        groups = _split_bands(items, axis)
+        if len(groups) > 1:
+            return [item for group in groups for item in _reading_order(group)]
+    return sorted(items, key=lambda i: -i["bbox"][3])
+
+
+def _join_lines(lines):
+    """Lines of one paragraph → text, undoing end-of-line hyphenation."""
+    text = ""
+    for line in lines:
+        if text.endswith("-") and line[:1].islower():
+            text = text[:-1] + line
+        else:
+            text = f"{text} {line}" if text else line
+    return text
+
+
+def _heading_level(block, body):
+    lines = block["lines"]
+    text = _join_lines([ln["text"] for ln in lines])
+    if not body or len(text) > HEADING_MAX_CHARS:
+        return text, None
+    size = max(ln["size"] for ln in lines)
+    if size >= body * TITLE_RATIO:
+        return text, 1
+    if size >= body * HEADING_RATIO:
+        return text, 2
+    if len(lines) == 1 and lines[0]["bold"]:
+        return text, 3
+    return text, None
+
+
+def _page_blocks(page):
+    """
+    One page → blocks in reading order: ("text", text, heading level or
+    None) and ("table", rows, None).
+    """
+    tables = _find_tables(_rule_segments(page))
+    textpage = page.get_textpage()
+    try:
+        lines = _text_lines(textpage, tables)
+    finally:
+        textpage.close()
+
+    body_lines = []
+    for line in lines:
+        if line["cell"] is None:
+            body_lines.append(line)
+        else:
+            n, row, col = line["cell"]
+            tables[n]["cells"].setdefault((row, col), []).append(line["text"])
+    lines = body_lines
+
+    sizes = Counter()
+    for line in lines:
+        sizes[line["size"]] += len(line["text"])
+    body = sizes.most_common(1)[0][0] if sizes else None
+
+    blocks = []
+    for item in _reading_order(_paragraphs(lines) + tables):
+        if item["kind"] == "table":
+            rows = _table_rows(item)
+            if rows:
+                blocks.append(("table", rows, None))
+        else:
+            blocks.append(("text", *_heading_level(item, body)))
+    return blocks
+
+
+def _text_flow_docx(input_pdf_path, output_docx_path):
+    """
+    Text-flow DOCX from pdfium text runs: paragraphs, headings (by font
+    size / bold) and ruled tables. Pages are loaded one at a time and
+    appended as they come; no positions, images or styling.
+    """
+    doc = Document()
+    found = False
+
+    pdf = pdfium.PdfDocument(input_pdf_path)
+    try:
+        for n in range(len(pdf)):
+            with span("pdf_to_word.page", page=n + 1) as s:
+                page = pdf[n]
+                try:
+                    blocks = _page_blocks(page)
+                finally:
+                    page.close()
+
+                for kind, value, level in blocks:
+                    if kind == "table":
+                        table = doc.add_table(rows=len(value), cols=len(value[0]))
+                        table.style = "Table Grid"
+                        for row, cells in zip(table.rows, value):
+                            for cell, text in zip(row.cells, cells):
+                                cell.text = text
+                    elif level:
+                        doc.add_heading(value, level=level)
+                    else:
+                        doc.add_paragraph(value)
+                found = found or bool(blocks)
+                s.set(blocks=len(blocks))
+    finally:
+        pdf.close()
+
+    if not found:
+        doc.add_paragraph("No text layer found. This PDF may be scanned or image-based, run OCR first.")
+    doc.save(output_docx_path)
+
+
+def pdf_to_word(input_pdf_path, output_docx_path, mode="layout"):
+    """
+    Convert PDF to editable Word (DOCX) file.
+
+    mode="layout": pdf2docx layout reconstruction (positions, images, styles)
+    mode="text":   fast text flow only (paragraphs, headings, simple tables)
+    """
+    if mode not in MODES:
+        raise RuntimeError(f"Unknown PDF to Word mode: {mode}")
+
     try:
-        cv = Converter(input_pdf_path)
-        cv.convert(output_docx_path, start=0, end=None)
-        cv.close()
+        if mode == "text":
+            _text_flow_docx(input_pdf_path, output_docx_path)
+        else:
+            cv = Converter(input_pdf_path)
+            cv.convert(output_docx_path, start=0, end=None)
+            cv.close()
     except Exception as e:
-        raise RuntimeError(f"PDF to Word conversion failed: {e}")
\ No newline at end of file
+        raise RuntimeError(f"PDF to Word conversion failed: {e}")
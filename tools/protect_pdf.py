@@ -1,19 +1,70 @@
-from PyPDF2 import PdfReader, PdfWriter
+import secrets
+import pikepdf
+from tools.pdf_output import write_pdf
 
+# Request-level permission names → pikepdf.Permissions fields
+PERMISSION_FLAGS = {
+    "print": ("print_lowres", "print_highres"),
+    "print_lowres": ("print_lowres",),
+    "copy": ("extract",),
+    "extract": ("extract",),
+    "modify": ("modify_other",),
+    "annotate": ("modify_annotation",),
+    "forms": ("modify_form",),
+    "assemble": ("modify_assembly",),
+    "accessibility": ("accessibility",),
+}
 
-def protect_pdf(input_pdf_path: str, output_pdf_path: str, password: str):
+
+def build_permissions(allowed=None):
     """
-    Protect PDF with password (AES-128)
+    allowed: None → everything allowed,
+             iterable of names from PERMISSION_FLAGS → only those allowed.
     """
+    fields = set()
+    for group in PERMISSION_FLAGS.values():
+        fields.update(group)
+
+    if allowed is None:
+        return pikepdf.Permissions(**{f: True for f in fields})
+
+    granted = set()
+    for name in allowed:
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in PERMISSION_FLAGS:
+            raise ValueError(f"Unknown permission: {name}")
+        granted.update(PERMISSION_FLAGS[name])
+
+    return pikepdf.Permissions(**{f: f in granted for f in fields})
 
-    reader = PdfReader(input_pdf_path)
-    writer = PdfWriter()
 
-    for page in reader.pages:
-        writer.add_page(page)
+def protect_pdf(input_pdf_path: str, output_pdf_path: str, password: str,
+                owner_password: str = None, permissions=None, linearize=False):
+    """
+    Protect PDF with password (AES-256, PDF 2.0 security handler R6).
+    Encryption is applied by qpdf in one native pass on save, the page
+    tree is not rebuilt.
+
+    owner_password: defaults to the user password; with `permissions`
+        set it defaults to a random one instead, otherwise anyone who can
+        open the file could lift the restrictions
+    permissions: see build_permissions()
+    """
+    if not owner_password:
+        owner_password = secrets.token_urlsafe(32) if permissions is not None else password
 
-    # Encrypt PDF
-    writer.encrypt(user_password=password, owner_password=password, use_128bit=True)
+    with pikepdf.open(input_pdf_path) as pdf:
+        write_pdf(
+            pdf, output_pdf_path,
+            linearize=linearize,
+            encryption=pikepdf.Encryption(
+                user=password,
+                owner=owner_password,
+                R=6,
+                allow=build_permissions(permissions),
+            ),
+        )
 
-    with open(output_pdf_path, "wb") as f:
-        writer.write(f)
\ No newline at end of file
+    return output_pdf_path
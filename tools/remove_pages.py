@@ -1,6 +1,7 @@
 import PyPDF2
+from tools.pdf_output import write_pdf
 
-def remove_pages(input_path, output_path, pages_to_delete):
+def remove_pages(input_path, output_path, pages_to_delete, linearize=False):
     reader = PyPDF2.PdfReader(input_path)
     writer = PyPDF2.PdfWriter()
 
@@ -8,5 +9,4 @@ def remove_pages(input_path, output_path, pages_to_delete):
         if index not in pages_to_delete:
             writer.add_page(page)
 
-    with open(output_path, "wb") as f:
-        writer.write(f)
+    write_pdf(writer, output_path, linearize=linearize)
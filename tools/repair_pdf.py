@@ -1,11 +1,47 @@
-import subprocess
 import os
+import pikepdf
+import pypdfium2 as pdfium
+from tools.pdf_output import write_pdf, optimize_file
+from tools.tracing import span, run_subprocess
 
-def repair_pdf(input_path, output_path):
-    temp_fixed = input_path.replace(".pdf", "_gs_fixed.pdf")
+# Validation render: tiny scale, only proves every page's content parses
+VALIDATE_SCALE = 0.05
+
+
+def validate_pdf(path):
+    """True when pdfium opens the file and renders every page."""
+    try:
+        pdf = pdfium.PdfDocument(path)
+    except Exception:
+        return False
+
+    try:
+        if len(pdf) == 0:
+            return False
+        for i in range(len(pdf)):
+            page = pdf[i]
+            page.render(scale=VALIDATE_SCALE)
+            page.close()
+        return True
+    except Exception:
+        return False
+    finally:
+        pdf.close()
+
+
+def _structural_repair(input_path, output_path, linearize=False):
+    """qpdf xref/stream reconstruction + rewrite, no re-rendering."""
+    with pikepdf.open(input_path, attempt_recovery=True) as pdf:
+        if len(pdf.pages) == 0:
+            raise RuntimeError("No pages recovered")
+        write_pdf(pdf, output_path, linearize=linearize)
+
+
+def _ghostscript_repair(input_path, output_path, linearize=False):
+    temp_fixed = output_path + ".gs.pdf"
 
     try:
-        subprocess.run([
+        run_subprocess([
             "gs",
             "-o", temp_fixed,
             "-sDEVICE=pdfwrite",
@@ -21,5 +57,33 @@ def repair_pdf(input_path, output_path):
 
     if os.path.exists(temp_fixed):
         os.rename(temp_fixed, output_path)
+        if linearize:
+            optimize_file(output_path, linearize=True)
     else:
         raise Exception("Output not generated")
+
+
+def repair_pdf(input_path, output_path, linearize=False):
+    """
+    Tiered repair:
+      1. "structural"  → qpdf rebuilds the xref table / broken streams and
+                         rewrites the file (milliseconds, lossless)
+      2. "ghostscript" → full pdfwrite re-render (slow, re-encodes images),
+                         only when tier 1 fails or its output doesn't
+                         open + render in pdfium
+    Returns the tier that produced output_path.
+    """
+    try:
+        with span("repair.structural"):
+            _structural_repair(input_path, output_path, linearize=linearize)
+        with span("repair.validate"):
+            if validate_pdf(output_path):
+                return "structural"
+    except Exception as e:
+        print("STRUCTURAL REPAIR FAILED:", e)
+
+    if os.path.exists(output_path):
+        os.remove(output_path)
+
+    _ghostscript_repair(input_path, output_path, linearize=linearize)
+    return "ghostscript"
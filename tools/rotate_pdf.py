@@ -1,8 +1,9 @@
 import os
 from PyPDF2 import PdfReader, PdfWriter
+from tools.pdf_output import write_pdf
 
 
-def rotate_pdf(input_path: str, output_path: str, rotation: int):
+def rotate_pdf(input_path: str, output_path: str, rotation: int, linearize=False):
     """
     Rotate all pages of a PDF by given degrees.
     rotation: 90 | 180 | 270
@@ -18,7 +19,6 @@ def rotate_pdf(input_path: str, output_path: str, rotation: int):
         page.rotate(rotation)
         writer.add_page(page)
 
-    with open(output_path, "wb") as f:
-        writer.write(f)
+    write_pdf(writer, output_path, linearize=linearize)
 
     return output_path
\ No newline at end of file
@@ -1,46 +1,64 @@
+import io
 from PyPDF2 import PdfReader, PdfWriter
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
-import tempfile
-from PIL import Image
+from tools.pdf_output import write_pdf
+from tools.incremental import overlay_pages_incremental
+
+
+def _signature_overlay(text, image_path, x, y, w, h):
+    """One A4 page with the signature, as PDF bytes."""
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    pw, ph = A4
+
+    rx = x * pw
+    ry = y * ph
+    rw = w * pw
+    rh = h * ph
+
+    if image_path:
+        c.drawImage(image_path, rx, ry, rw, rh, mask="auto")
+    elif text:
+        c.setFont("Helvetica-Bold", 20)
+        c.drawString(rx, ry, text)
+
+    c.save()
+    return buf.getvalue()
+
 
 def sign_pdf(
     input_pdf, output_pdf,
     text=None, image_path=None,
     page_mode="all", page=None,
     position_mode="same",
-    x=0.1, y=0.1, w=0.3, h=0.15
+    x=0.1, y=0.1, w=0.3, h=0.15,
+    linearize=False,
+    incremental=False
 ):
+    """
+    incremental=True appends only the signed pages + the signature
+    XObject to the original bytes (see tools/incremental.py) instead of
+    rewriting the document. Not combinable with linearize.
+    """
+    overlay = _signature_overlay(text, image_path, x, y, w, h)
+
+    if incremental and not linearize:
+        targets = None if page_mode == "all" else [page-1] if page_mode == "single" else []
+        if overlay_pages_incremental(input_pdf, output_pdf, overlay, targets):
+            return
+
     reader = PdfReader(input_pdf)
     writer = PdfWriter()
+    overlay_page = PdfReader(io.BytesIO(overlay)).pages[0]
 
     for i, page_obj in enumerate(reader.pages):
         apply = (
             page_mode == "all" or
             (page_mode == "single" and i == page-1)
         )
-
         if apply:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                c = canvas.Canvas(tmp.name, pagesize=A4)
-                pw, ph = A4
-
-                rx = x * pw
-                ry = y * ph
-                rw = w * pw
-                rh = h * ph
-
-                if image_path:
-                    c.drawImage(image_path, rx, ry, rw, rh, mask="auto")
-                elif text:
-                    c.setFont("Helvetica-Bold", 20)
-                    c.drawString(rx, ry, text)
-
-                c.save()
-                overlay = PdfReader(tmp.name)
-                page_obj.merge_page(overlay.pages[0])
-
+            page_obj.merge_page(overlay_page)
         writer.add_page(page_obj)
 
-    with open(output_pdf, "wb") as f:
-        writer.write(f)
\ No newline at end of file
+    write_pdf(writer, output_pdf, linearize=linearize)
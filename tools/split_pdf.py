@@ -1,7 +1,14 @@
 # tools/split_pdf.py
+import os
+import re
+import shutil
+import zipfile
+import pikepdf
 from PyPDF2 import PdfReader, PdfWriter
+from tools.pdf_output import write_pdf
+from tools.merge_pdf import resolve_destination
 
-def split_selected_pages(input_path: str, output_path: str, pages):
+def split_selected_pages(input_path: str, output_path: str, pages, linearize=False):
     """
     pages: iterable of ints (1-based page numbers)
     """
@@ -17,5 +24,148 @@ def split_selected_pages(input_path: str, output_path: str, pages):
         if 1 <= pi <= total:
             writer.add_page(reader.pages[pi - 1])
 
-    with open(output_path, "wb") as f:
-        writer.write(f)
+    write_pdf(writer, output_path, linearize=linearize)
+
+
+# ========== SPLIT INTO MANY ==========
+
+SPLIT_MODES = ("every", "ranges", "bookmarks")
+
+
+def every_n_groups(total, n):
+    """[[0, 1, 2], [3, 4, 5], ...] (0-based) for chunks of n pages."""
+    try:
+        n = int(n)
+    except (TypeError, ValueError):
+        raise ValueError(f"n must be a whole number, got {n!r}")
+    if n < 1:
+        raise ValueError("n must be at least 1")
+    return [list(range(i, min(i + n, total))) for i in range(0, total, n)]
+
+
+def range_groups(spec, total):
+    """
+    "1-3,5;6-10;11-" → one output per ';'-separated group (1-based,
+    open-ended ranges run to the last page). Out-of-range pages are dropped.
+    """
+    groups = []
+    for group in spec.split(";"):
+        pages = []
+        for part in group.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            start, dash, end = part.partition("-")
+            try:
+                start = int(start) if start.strip() else 1
+                end = (int(end) if end.strip() else total) if dash else start
+            except ValueError:
+                raise ValueError(f"Bad page range: {part!r}")
+            pages.extend(p - 1 for p in range(start, end + 1) if 1 <= p <= total)
+        if pages:
+            groups.append(pages)
+    return groups
+
+
+def bookmark_groups(pdf):
+    """
+    One group per top-level outline entry, from its page up to the page
+    before the next entry. Pages before the first bookmark go with it.
+    Returns [(title, [page indexes])].
+    """
+    total = len(pdf.pages)
+    page_index = {p.objgen: i for i, p in enumerate(pdf.pages)}
+
+    starts = []
+    with pdf.open_outline() as outline:
+        for item in outline.root:
+            idx = resolve_destination(pdf, item, page_index)
+            if idx is not None and 0 <= idx < total:
+                starts.append((idx, str(item.title)))
+
+    starts.sort(key=lambda s: s[0])
+    groups = []
+    for i, (idx, title) in enumerate(starts):
+        end = starts[i + 1][0] if i + 1 < len(starts) else total
+        if i == 0:
+            idx = 0
+        if end > idx:
+            groups.append((title, list(range(idx, end))))
+    return groups
+
+
+def _safe_name(title):
+    return re.sub(r"[^\w\-. ]+", "", title).strip()[:60] or "part"
+
+
+def check_split(mode, value):
+    """ValueError for an unknown mode or a malformed value, before any work."""
+    if mode not in SPLIT_MODES:
+        raise ValueError(f"Unknown split mode: {mode}")
+    if mode == "every":
+        every_n_groups(0, value or 1)
+    elif mode == "ranges":
+        if not (value or "").strip():
+            raise ValueError("Missing ranges")
+        range_groups(value, 0)
+
+
+def _write_group(src, pages, output_path, linearize):
+    with pikepdf.new() as out:
+        for i in pages:
+            out.pages.append(src.pages[i])
+        write_pdf(out, output_path, linearize=linearize)
+
+
+def split_pdf(input_path, output_dir, mode="every", value=None, linearize=False, name=None):
+    """
+    Split one PDF into many in a single parse.
+
+    mode:
+      "every"     → value = N, a new document every N pages
+      "ranges"    → value = "1-3,5;6-10;11-" (one document per group)
+      "bookmarks" → one document per top-level bookmark
+
+    Parts are named <name>_partNN.pdf (name defaults to the input's file
+    name) or NN_<bookmark title>.pdf. The input is opened once
+    (memory-mapped) and every part is copied from it.
+    Returns the list of output paths in order.
+    """
+    check_split(mode, value)
+    os.makedirs(output_dir, exist_ok=True)
+    base = name or os.path.splitext(os.path.basename(input_path))[0]
+
+    with pikepdf.open(input_path, access_mode=pikepdf.AccessMode.mmap) as pdf:
+        total = len(pdf.pages)
+        if mode == "every":
+            groups = [(None, g) for g in every_n_groups(total, value or 1)]
+        elif mode == "ranges":
+            groups = [(None, g) for g in range_groups(value, total)]
+        else:
+            groups = bookmark_groups(pdf)
+
+        if not groups:
+            raise RuntimeError("Nothing to split (no matching pages or bookmarks)")
+
+        width = len(str(len(groups)))
+        outputs = []
+        for n, (title, pages) in enumerate(groups, start=1):
+            part = f"{n:0{width}d}_{_safe_name(title)}" if title else f"{base}_part{n:0{width}d}"
+            path = os.path.join(output_dir, part + ".pdf")
+            _write_group(pdf, pages, path, linearize)
+            outputs.append(path)
+
+        return outputs
+
+
+def split_pdf_to_zip(input_path, zip_path, mode="every", value=None, linearize=False, name=None):
+    """split_pdf() with all parts packed into one zip (stored, PDFs are already compressed)."""
+    parts_dir = zip_path + ".parts"
+    try:
+        paths = split_pdf(input_path, parts_dir, mode, value, linearize, name=name)
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_STORED) as zf:
+            for path in paths:
+                zf.write(path, os.path.basename(path))
+        return len(paths)
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
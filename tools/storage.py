@@ -0,0 +1,166 @@
+"""
+Result storage: tool outputs are handed to a storage backend and the
+client gets a short-lived signed download URL, so the download itself
+never ties up an application worker.
+
+    RESULT_STORAGE=                           → no storage, send_file() as before
+    RESULT_STORAGE=file:///srv/results        → local disk + static file sidecar
+    RESULT_STORAGE=s3://bucket/prefix         → S3 / S3-compatible store
+                                                (needs the `boto3` package)
+
+Local disk: RESULT_PUBLIC_URL is where the sidecar serves the directory
+(default /files, also served by the app itself as a fallback). Links
+use nginx secure_link's format, so nginx can check them itself:
+
+    location /files/ {
+        secure_link $arg_md5,$arg_expires;
+        secure_link_md5 "$secure_link_expires$uri RESULT_URL_SECRET";
+        if ($secure_link = "")  { return 403; }
+        if ($secure_link = "0") { return 410; }
+        alias /srv/results/;
+        add_header Content-Disposition "attachment";
+    }
+
+S3: credentials / region come from the usual AWS environment;
+S3_ENDPOINT_URL points at MinIO, a local test server etc. Expired
+objects are left to a bucket lifecycle rule.
+"""
+import os
+import time
+import uuid
+import hmac
+import base64
+import shutil
+import hashlib
+import threading
+import mimetypes
+from urllib.parse import urlparse, quote, urlencode
+from werkzeug.utils import secure_filename
+from tools.tracing import span
+
+RESULT_STORAGE = os.environ.get("RESULT_STORAGE", "")
+RESULT_URL_TTL = int(os.environ.get("RESULT_URL_TTL", 300))           # link lifetime, seconds
+RESULT_PUBLIC_URL = os.environ.get("RESULT_PUBLIC_URL", "/files")
+RESULT_URL_SECRET = os.environ.get("RESULT_URL_SECRET", "")
+RESULT_RETENTION = int(os.environ.get("RESULT_RETENTION", 3600))      # local files, seconds
+EVICT_INTERVAL = 60
+
+
+def _new_key(download_name):
+    """<random>/<download name>: the last path segment is the file name."""
+    return f"{uuid.uuid4().hex}/{secure_filename(download_name) or 'result'}"
+
+
+class LocalStorage:
+    """Results under <root>/<key>, links signed for the static sidecar."""
+
+    def __init__(self, root, public_url=RESULT_PUBLIC_URL, secret=RESULT_URL_SECRET,
+                 retention=RESULT_RETENTION):
+        if not secret:
+            raise RuntimeError("RESULT_STORAGE=file:// needs RESULT_URL_SECRET")
+        self.root = root
+        self.public_url = public_url.rstrip("/")
+        self.secret = secret
+        self.retention = retention
+        self._last_evict = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def put(self, path, download_name):
+        """Move a finished output into the store, returns its key."""
+        self.evict_expired()
+        key = _new_key(download_name)
+        target = self.path(key)
+        with span("storage.put", backend="local", bytes=os.path.getsize(path)):
+            os.makedirs(os.path.dirname(target))
+            shutil.move(path, target)
+        return key
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def _signature(self, uri, expires):
+        # nginx secure_link_md5 "$secure_link_expires$uri <secret>"
+        digest = hashlib.md5(f"{expires}{uri} {self.secret}".encode()).digest()
+        return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+    def _uri(self, key):
+        return urlparse(self.public_url).path + "/" + quote(key)
+
+    def url(self, key, download_name, ttl=RESULT_URL_TTL):
+        expires = int(time.time()) + ttl
+        query = urlencode({"md5": self._signature(self._uri(key), expires), "expires": expires})
+        return f"{self.public_url}/{quote(key)}?{query}"
+
+    def verify(self, key, signature, expires):
+        """Check a link (app fallback for the sidecar)."""
+        try:
+            expires = int(expires)
+        except (TypeError, ValueError):
+            return False
+        if expires < time.time():
+            return False
+        expected = self._signature(self._uri(key), expires)
+        return hmac.compare_digest(str(signature or "").encode(), expected.encode())
+
+    def evict_expired(self, force=False):
+        """Drop results older than the retention (at most once per EVICT_INTERVAL)."""
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_evict < EVICT_INTERVAL:
+                return
+            self._last_evict = now
+
+        for name in os.listdir(self.root):
+            folder = os.path.join(self.root, name)
+            try:
+                expired = os.path.getmtime(folder) < now - self.retention
+            except OSError:
+                expired = False
+            if expired:
+                shutil.rmtree(folder, ignore_errors=True)
+
+
+class S3Storage:
+    """Results uploaded to a bucket, links are presigned GETs."""
+
+    def __init__(self, bucket, prefix=""):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("RESULT_STORAGE=s3:// needs the boto3 package (pip install boto3)")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = boto3.client("s3", endpoint_url=os.environ.get("S3_ENDPOINT_URL") or None)
+
+    def put(self, path, download_name):
+        """Upload a finished output (local file is left to the caller), returns its key."""
+        key = _new_key(download_name)
+        if self.prefix:
+            key = f"{self.prefix}/{key}"
+        content_type = mimetypes.guess_type(download_name)[0] or "application/octet-stream"
+        with span("storage.put", backend="s3", bytes=os.path.getsize(path)):
+            self.client.upload_file(path, self.bucket, key, ExtraArgs={"ContentType": content_type})
+        return key
+
+    def url(self, key, download_name, ttl=RESULT_URL_TTL):
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket, "Key": key,
+                "ResponseContentDisposition": f'attachment; filename="{secure_filename(download_name)}"',
+            },
+            ExpiresIn=ttl,
+        )
+
+
+def get_storage(url=RESULT_STORAGE):
+    """Storage for a RESULT_STORAGE url, or None when results are sent directly."""
+    if not url:
+        return None
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        return LocalStorage(parsed.path)
+    if parsed.scheme == "s3":
+        return S3Storage(parsed.netloc, parsed.path)
+    raise RuntimeError(f"Unsupported RESULT_STORAGE: {url}")
@@ -0,0 +1,150 @@
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import pypdfium2 as pdfium
+
+THUMB_CACHE = os.environ.get("THUMB_CACHE", "/tmp/thumbnails")
+THUMB_MIN_SIZE = 32
+THUMB_MAX_SIZE = 512
+THUMB_QUALITY = 70
+
+# Cache cleanup: a document's thumbnails go THUMB_TTL seconds after their
+# last use; above THUMB_CACHE_MAX_MB the least recently used go first
+THUMB_TTL = int(os.environ.get("THUMB_TTL", 3600))
+THUMB_CACHE_MAX_MB = int(os.environ.get("THUMB_CACHE_MAX_MB", 512))
+EVICT_INTERVAL = 60
+
+# Below this many uncached pages rendering inline beats the pool round trip
+PARALLEL_MIN_PAGES = 8
+THUMB_WORKERS = min(4, os.cpu_count() or 1)
+
+_pool = None
+_last_evict = 0
+_evict_lock = threading.Lock()
+
+
+def _get_pool():
+    """One render pool per worker process, created on first use."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=THUMB_WORKERS)
+    return _pool
+
+
+def _dir_size(path):
+    total = 0
+    for entry in os.scandir(path):
+        try:
+            total += entry.stat().st_size
+        except OSError:
+            pass
+    return total
+
+
+def evict_thumbnails(cache_dir=THUMB_CACHE, keep=None, force=False):
+    """
+    Drop documents unused for THUMB_TTL, then the least recently used
+    ones while the cache is above THUMB_CACHE_MAX_MB (at most once per
+    EVICT_INTERVAL). `keep` (a doc hash in use right now) is never dropped.
+    """
+    global _last_evict
+    now = time.time()
+    with _evict_lock:
+        if not force and now - _last_evict < EVICT_INTERVAL:
+            return
+        _last_evict = now
+
+    entries = []
+    for name in os.listdir(cache_dir) if os.path.isdir(cache_dir) else []:
+        folder = os.path.join(cache_dir, name)
+        try:
+            entries.append((os.path.getmtime(folder), _dir_size(folder), name))
+        except OSError:
+            continue
+
+    total = sum(size for _, size, _ in entries)
+    limit = THUMB_CACHE_MAX_MB * 1024 * 1024
+    for used, size, name in sorted(entries):
+        if name == keep:
+            continue
+        if used < now - THUMB_TTL or total > limit:
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+            total -= size
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def thumb_name(page, size):
+    return f"{size}_{page}.webp"
+
+
+def _render_pages(input_path, pages, size, out_dir):
+    """Render 1-based pages so their longest side is `size` px, as WebP."""
+    pdf = pdfium.PdfDocument(input_path)
+    try:
+        for n in pages:
+            page = pdf[n - 1]
+            w, h = page.get_size()
+            img = page.render(scale=size / max(w, h, 1)).to_pil()
+            page.close()
+
+            # Write to a temp name first so readers never see half a file
+            fd, tmp = tempfile.mkstemp(dir=out_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                img.save(f, "WEBP", quality=THUMB_QUALITY, method=4)
+            os.replace(tmp, os.path.join(out_dir, thumb_name(n, size)))
+    finally:
+        pdf.close()
+
+
+def render_thumbnails(input_path, first=1, last=None, size=160, cache_dir=THUMB_CACHE):
+    """
+    Small WebP previews for pages first..last (1-based, inclusive).
+
+    Thumbnails are cached on disk under <cache_dir>/<sha256 of file>/, so
+    the same document is rendered only once per page and size, and cleaned
+    up by age / total size (see evict_thumbnails). Uncached pages are
+    split over a process pool (pdfium is not thread-safe).
+
+    Returns (doc_hash, page_count, [(page, file_name)]).
+    """
+    size = max(THUMB_MIN_SIZE, min(THUMB_MAX_SIZE, int(size)))
+    doc_hash = file_hash(input_path)
+    out_dir = os.path.join(cache_dir, doc_hash)
+    os.makedirs(out_dir, exist_ok=True)
+    os.utime(out_dir)       # last use, for eviction
+    evict_thumbnails(cache_dir, keep=doc_hash)
+
+    pdf = pdfium.PdfDocument(input_path)
+    total = len(pdf)
+    pdf.close()
+
+    first = max(1, int(first))
+    last = min(int(last) if last else total, total)
+    pages = list(range(first, last + 1))
+
+    missing = [n for n in pages
+               if not os.path.exists(os.path.join(out_dir, thumb_name(n, size)))]
+
+    if len(missing) < PARALLEL_MIN_PAGES:
+        if missing:
+            _render_pages(input_path, missing, size, out_dir)
+    else:
+        pool = _get_pool()
+        chunks = [missing[i::THUMB_WORKERS] for i in range(THUMB_WORKERS)]
+        futures = [pool.submit(_render_pages, input_path, chunk, size, out_dir)
+                   for chunk in chunks if chunk]
+        for fut in futures:
+            fut.result()
+
+    return doc_hash, total, [(n, thumb_name(n, size)) for n in pages]
@@ -0,0 +1,289 @@
+"""
+Minimal request tracing.
+
+Every request gets a trace; code records nested spans with
+
+    with span("ocr.page", page=3):
+        ...
+
+Finished spans are exported in the background to
+  TRACE_FILE           → one JSON object per line
+  TRACE_OTLP_ENDPOINT  → OTLP/HTTP JSON (e.g. http://localhost:4318/v1/traces)
+With neither set, spans are still timed (trace ids are returned to
+clients) but nothing is written.
+
+Local OTLP collector stand-in that appends received spans to a file:
+
+    python -m tools.tracing --port 4318 --out traces.jsonl
+"""
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import argparse
+import threading
+import contextlib
+import contextvars
+import subprocess
+import urllib.request
+
+TRACE_FILE = os.environ.get("TRACE_FILE")
+TRACE_OTLP_ENDPOINT = os.environ.get("TRACE_OTLP_ENDPOINT")
+SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "srj-tools-api")
+EXPORT_BATCH = 256
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attrs",
+                 "start_ns", "end_ns", "error")
+
+    def __init__(self, name, trace_id, parent_id=None, attrs=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attrs = dict(attrs or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self, error=None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        _exporter.submit(self)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attrs,
+            "error": self.error,
+        }
+
+
+def start_span(name, parent=None, trace_id=None, **attrs):
+    """
+    Start a span (caller must finish() it). Parent defaults to the current
+    span; without one a new trace is started.
+    """
+    parent = parent if parent is not None else _current.get()
+    if trace_id is None:
+        trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+    return Span(name, trace_id, parent.span_id if parent is not None else None, attrs)
+
+
+def activate(s):
+    """Make s the current span; returns a token for deactivate()."""
+    return _current.set(s)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def current_span():
+    return _current.get()
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    s = start_span(name, **attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.finish(error=e)
+        raise
+    else:
+        s.finish()
+    finally:
+        _current.reset(token)
+
+
+def run_subprocess(cmd, **kwargs):
+    """subprocess.run() inside a "subprocess.<program>" span."""
+    program = os.path.basename(str(cmd[0]))
+    with span(f"subprocess.{program}", argv=" ".join(map(str, cmd))) as s:
+        result = subprocess.run(cmd, **kwargs)
+        s.set(returncode=result.returncode)
+        return result
+
+
+# ===== Export =====
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _from_otlp_value(value):
+    if "intValue" in value:
+        return int(value["intValue"])
+    return next(iter(value.values()), None)
+
+
+def to_otlp(spans):
+    """OTLP/HTTP JSON body for a list of span dicts."""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [
+            {"key": "service.name", "value": {"stringValue": SERVICE_NAME}}
+        ]},
+        "scopeSpans": [{
+            "scope": {"name": "tools.tracing"},
+            "spans": [{
+                "traceId": s["trace_id"],
+                "spanId": s["span_id"],
+                "parentSpanId": s["parent_id"] or "",
+                "name": s["name"],
+                "kind": 1,
+                "startTimeUnixNano": str(s["start_ns"]),
+                "endTimeUnixNano": str(s["end_ns"]),
+                "attributes": [{"key": k, "value": _otlp_value(v)}
+                               for k, v in s["attributes"].items()],
+                "status": {"code": 2, "message": s["error"]} if s["error"] else {"code": 1},
+            } for s in spans],
+        }],
+    }]}
+
+
+def from_otlp(body):
+    """Flatten an OTLP/HTTP JSON body back into span dicts."""
+    out = []
+    for rs in body.get("resourceSpans", []):
+        for ss in rs.get("scopeSpans", []):
+            for s in ss.get("spans", []):
+                start, end = int(s["startTimeUnixNano"]), int(s["endTimeUnixNano"])
+                attrs = {a["key"]: _from_otlp_value(a["value"]) for a in s.get("attributes", [])}
+                out.append({
+                    "trace_id": s["traceId"],
+                    "span_id": s["spanId"],
+                    "parent_id": s.get("parentSpanId") or None,
+                    "name": s["name"],
+                    "start_ns": start,
+                    "end_ns": end,
+                    "duration_ms": round((end - start) / 1e6, 3),
+                    "attributes": attrs,
+                    "error": s.get("status", {}).get("message"),
+                })
+    return out
+
+
+class _Exporter:
+    """Background batch exporter; a no-op when nothing is configured."""
+
+    def __init__(self, path=TRACE_FILE, endpoint=TRACE_OTLP_ENDPOINT):
+        self.path = path
+        self.endpoint = endpoint
+        self.enabled = bool(path or endpoint)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, s):
+        if not self.enabled:
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+        self._queue.put(s.to_dict())
+
+    def _drain(self, block):
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=1.0) if block else self._queue.get_nowait())
+            while len(batch) < EXPORT_BATCH:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _write(self, batch):
+        if not batch:
+            return
+        if self.path:
+            with open(self.path, "a", encoding="utf-8") as f:
+                for s in batch:
+                    f.write(json.dumps(s) + "\n")
+        if self.endpoint:
+            try:
+                req = urllib.request.Request(
+                    self.endpoint, data=json.dumps(to_otlp(batch)).encode(),
+                    headers={"Content-Type": "application/json"}, method="POST"
+                )
+                urllib.request.urlopen(req, timeout=5).close()
+            except Exception as e:
+                print("TRACE EXPORT ERROR:", e, file=sys.stderr)
+
+    def _run(self):
+        while True:
+            self._write(self._drain(block=True))
+
+    def flush(self):
+        while True:
+            batch = self._drain(block=False)
+            if not batch:
+                return
+            self._write(batch)
+
+
+_exporter = _Exporter()
+
+
+# ===== Local OTLP collector stand-in =====
+def serve_collector(port, out_path):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                spans = from_otlp(json.loads(body))
+            except ValueError:
+                self.send_response(400)
+                self.end_headers()
+                return
+            with lock, open(out_path, "a", encoding="utf-8") as f:
+                for s in spans:
+                    f.write(json.dumps(s) + "\n")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    print(f"OTLP collector on :{port}/v1/traces → {out_path}")
+    ThreadingHTTPServer(("0.0.0.0", port), Handler).serve_forever()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Local OTLP/HTTP JSON collector")
+    ap.add_argument("--port", type=int, default=4318)
+    ap.add_argument("--out", default="traces.jsonl")
+    args = ap.parse_args()
+    serve_collector(args.port, args.out)
@@ -1,18 +1,16 @@
-import os
-from PyPDF2 import PdfReader, PdfWriter
+import pikepdf
+from tools.pdf_output import write_pdf
 
-def unlock_pdf(input_pdf_path: str, output_pdf_path: str, password: str):
-    reader = PdfReader(input_pdf_path)
+def unlock_pdf(input_pdf_path: str, output_pdf_path: str, password: str, linearize=False):
+    """
+    Remove encryption in one native qpdf pass (no page tree rebuild).
+    """
+    try:
+        pdf = pikepdf.open(input_pdf_path, password=password)
+    except pikepdf.PasswordError:
+        raise RuntimeError("Invalid password")
 
-    if reader.is_encrypted:
-        if not reader.decrypt(password):
-            raise RuntimeError("Invalid password")
+    with pdf:
+        write_pdf(pdf, output_pdf_path, linearize=linearize, encryption=False)
 
-    writer = PdfWriter()
-    for page in reader.pages:
-        writer.add_page(page)
-
-    with open(output_pdf_path, "wb") as f:
-        writer.write(f)
-
-    return output_pdf_path
\ No newline at end of file
+    return output_pdf_path
@@ -1,4 +1,5 @@
 import subprocess, tempfile, shutil, os
+from tools.tracing import run_subprocess
 
 def word_to_pdf(input_docx_path, output_pdf_path):
     """
@@ -8,7 +9,7 @@ def word_to_pdf(input_docx_path, output_pdf_path):
     try:
         temp_dir = tempfile.mkdtemp(dir="/tmp")
 
-        subprocess.run([
+        run_subprocess([
             "libreoffice",
             "--headless",
             "--convert-to", "pdf",